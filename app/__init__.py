@@ -1,7 +1,11 @@
 import os
+import math
+import time
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
-from flask import Flask, jsonify, request
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from flask import Flask, g, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
@@ -9,6 +13,7 @@ from flask_marshmallow import Marshmallow
 from flask_cors import CORS
 from flasgger import Swagger
 from flask_session import Session
+from sqlalchemy import event
 
 from config import Config
 
@@ -71,12 +76,30 @@ swagger_config = {
 swagger = Swagger(template=swagger_template, config=swagger_config)
 
 
+class BoundedQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full.
+
+    prepare() formats each record once on the calling thread (where the
+    request context is available), so the listener only writes strings.
+    """
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
 def setup_logging(app):
     class RequestFormatter(logging.Formatter):
         def format(self, record):
             record.url = request.url if request else "N/A"
             record.remote_addr = request.remote_addr if request else "N/A"
-            return json.dumps({
+            entry = {
                 'timestamp': self.formatTime(record, self.datefmt),
                 'level': record.levelname,
                 'message': record.getMessage(),
@@ -85,7 +108,10 @@ def setup_logging(app):
                 'module': record.module,
                 'funcName': record.funcName,
                 'lineno': record.lineno
-            })
+            }
+            if getattr(record, 'timing', None):
+                entry['timing'] = record.timing
+            return json.dumps(entry)
 
     if not os.path.exists('logs'):
         os.mkdir('logs')
@@ -97,9 +123,6 @@ def setup_logging(app):
         'info': TimedRotatingFileHandler('logs/info.log', when='midnight', backupCount=30),
     }
 
-    for handler in handlers.values():
-        handler.setFormatter(RequestFormatter())
-
     handlers['error'].setLevel(logging.ERROR)
     handlers['warning'].setLevel(logging.WARNING)
     handlers['info'].setLevel(logging.INFO)
@@ -108,14 +131,100 @@ def setup_logging(app):
     for handler in app.logger.handlers[:]:
         app.logger.removeHandler(handler)
 
-    # Add new handlers
-    for handler in handlers.values():
-        app.logger.addHandler(handler)
+    if app.config['LOG_ASYNC']:
+        # Serialize once on the request thread, then fan the finished line out
+        # to the level files from a background listener thread
+        for handler in handlers.values():
+            handler.setFormatter(logging.Formatter('%(message)s'))
+
+        queue_handler = BoundedQueueHandler(queue.Queue(maxsize=app.config['LOG_QUEUE_SIZE']))
+        queue_handler.setFormatter(RequestFormatter())
+        queue_handler.setLevel(logging.INFO)
+        listener = QueueListener(queue_handler.queue, *handlers.values(), respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+
+        app.logger.addHandler(queue_handler)
+        app.extensions['log_queue_handler'] = queue_handler
+    else:
+        for handler in handlers.values():
+            handler.setFormatter(RequestFormatter())
+            app.logger.addHandler(handler)
 
     app.logger.setLevel(logging.INFO)
 
 
 
+def setup_metrics(app):
+    from app.utils.metrics import db_query_duration, http_request_duration, http_requests, registry
+    from app.utils.timing import record_phase
+
+    registry.configure(app.config['METRICS_DIR'], app.config['METRICS_FLUSH_INTERVAL'])
+
+    if 'log_queue_handler' in app.extensions:
+        log_queue_handler = app.extensions['log_queue_handler']
+        registry.callback(
+            'log_records_dropped_total', 'Log records dropped because the log queue was full', 'counter',
+            lambda: {(): log_queue_handler.dropped}
+        )
+
+    @app.before_request
+    def start_request_timer():
+        registry.ensure_process()
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else '<unmatched>'
+            blueprint = request.blueprint or ''
+            http_request_duration.observe(time.perf_counter() - started, blueprint, route)
+            http_requests.inc(blueprint, route, request.method, str(response.status_code))
+        return response
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def record_query_time(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        db_query_duration.observe(elapsed)
+        record_phase('db', elapsed)
+
+
+def setup_server_timing(app):
+    """Report each request's time per phase in a Server-Timing header and a log field."""
+    from app.utils.timing import TimedJSONProvider, TimingFilter, current_breakdown, server_timing_header
+
+    app.json = TimedJSONProvider(app)
+    if not app.config['SERVER_TIMING_ENABLED']:
+        return
+
+    # The timing goes on the lines the request already logs rather than a
+    # line of its own. app.logger outlives the app, so drop an earlier filter.
+    for existing in app.logger.filters[:]:
+        if isinstance(existing, TimingFilter):
+            app.logger.removeFilter(existing)
+    app.logger.addFilter(TimingFilter())
+
+    @app.before_request
+    def start_server_timing():
+        g.server_timing = {}
+        g.server_timing_started = time.perf_counter()
+
+    @app.after_request
+    def add_server_timing(response):
+        breakdown = current_breakdown()
+        if breakdown is not None:
+            response.headers['Server-Timing'] = server_timing_header(breakdown)
+        return response
+
+
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
@@ -130,6 +239,16 @@ def create_app(config_class=Config):
 
     # Set up logging
     setup_logging(app)
+
+    # Set up request, database and queue metrics
+    setup_metrics(app)
+
+    # Set up the per-phase Server-Timing breakdown
+    setup_server_timing(app)
+
+    # Set up the opt-in request profiler
+    from app.utils.profiling import setup_profiling
+    setup_profiling(app)
     
     # Configuring SSL
     if app.config['SSL_CONTEXT']:
@@ -148,14 +267,36 @@ def create_app(config_class=Config):
         app.logger.error('Server Error: %s', (error))
         return jsonify(error="Internal server error"), 500
 
+    from app.services.queue_service import BrokerUnavailable
+
+    @app.errorhandler(BrokerUnavailable)
+    def broker_unavailable_error(error):
+        db.session.rollback()
+        app.logger.error('Broker unavailable: %s', (error))
+        retry_after = max(1, math.ceil(error.retry_after))
+        return jsonify(error="Queue temporarily unavailable"), 503, {'Retry-After': str(retry_after)}
+
     from app.routes import main
     app.register_blueprint(main.bp)
 
+    # Publish submitted requests from the outbox table in the background
+    from app.services.outbox_service import outbox_relay
+
+    @app.before_request
+    def start_outbox_relay():
+        outbox_relay.ensure_started(app)
+
     from app.routes import logs
     app.register_blueprint(logs.bp)
     
     from app.routes import auth
     app.register_blueprint(auth.bp)
+
+    from app.routes import metrics
+    app.register_blueprint(metrics.bp)
+
+    from app.routes import profiles
+    app.register_blueprint(profiles.bp)
     
     
 
@@ -0,0 +1,389 @@
+"""ASGI serving mode for the queue and result endpoints.
+
+Serves the queue and result endpoints of the ``main`` blueprint on one event
+loop per process, with an asyncio AMQP client and an async database driver, so
+a long poll or a result stream holds a coroutine instead of a worker thread.
+It uses the same models, database, queue, outbox and session tokens as the
+WSGI app, and the same validation, responses and event formatting
+(app.utils.auth and app.utils.request_api); only the I/O differs.
+Authentication, logs, metrics, profiles and ``/requests`` stay in the WSGI app.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8000
+"""
+import asyncio
+import contextlib
+import json
+import logging
+from functools import wraps
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.http import parse_etags, quote_etag
+
+from app.models.outbox import OutboxMessage
+from app.models.request import Request
+from app.models.user import User
+from app.services.async_lease_service import AsyncLeaseService
+from app.services.async_notification_service import AsyncResultNotifier
+from app.services.async_outbox_service import AsyncOutboxRelay
+from app.services.async_queue_service import AsyncQueueService
+from app.services.lease_service import complete_requests_statement
+from app.services.queue_service import BrokerUnavailable
+from app.utils.auth import AuthFailure, bearer_token, cache_principal, principal_cache, session_claims
+from app.utils.cache import ExpiringLRUCache
+from app.utils.request_api import (
+    InvalidBatch, ResultStream, batch_outcomes, batch_queries, batch_results, completable_results,
+    completed_events, result_entry, result_events, stream_request_ids
+)
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Async driver used for each database backend unless the URL already names one
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+    'mysql': 'mysql+aiomysql',
+}
+ASYNC_DRIVER_NAMES = {'asyncpg', 'psycopg', 'aiosqlite', 'aiomysql', 'asyncmy'}
+
+
+def async_database_url(url):
+    url = make_url(url)
+    if url.get_driver_name() in ASYNC_DRIVER_NAMES:
+        return url
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+def query_arg(request, name, type, default=None):
+    # Like Flask's request.args.get(name, default, type=type)
+    try:
+        return type(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def oauth_required(endpoint):
+    # Same checks, responses and principal cache as app.utils.auth.oauth_required
+    @wraps(endpoint)
+    async def decorated(request):
+        try:
+            session_token = bearer_token(request.headers.get('Authorization'))
+            user = principal_cache.get(session_token)
+            if not user:
+                decoded_token = session_claims(session_token)
+                try:
+                    async with request.app.state.sessionmaker() as session:
+                        user = await session.get(User, UUID(decoded_token['id']))
+                        if user:
+                            session.expunge(user)
+                except Exception as e:
+                    raise AuthFailure.invalid_token(e) from e
+                cache_principal(session_token, user, decoded_token)
+        except AuthFailure as e:
+            e.record(logger)
+            return JSONResponse({"msg": e.message}, 401)
+
+        request.state.current_user = user
+        return await endpoint(request)
+
+    return decorated
+
+
+async def notify_results(state, events):
+    # Stream subscribers fall back to a periodic database check, so a failed
+    # notification must never fail the submission itself
+    try:
+        await state.result_notifier.publish(events)
+    except Exception as e:
+        logger.error(f"Failed to publish result notifications: {str(e)}")
+
+
+async def find_result_events(state, request_ids):
+    async with state.sessionmaker() as session:
+        found = {req.id: req for req in (await session.execute(
+            select(Request).where(Request.id.in_(request_ids))
+        )).scalars()}
+    return result_events(request_ids, found)
+
+
+@oauth_required
+async def submit_request(request):
+    state = request.app.state
+    data = await request.json()
+    user = request.state.current_user
+    async with state.sessionmaker() as session:
+        new_request = Request(user_query=data['query'], user_id=user.id)
+        # Committed together, so the request is queued even if publishing fails now
+        session.add_all([new_request, OutboxMessage(request=new_request)])
+        await session.commit()
+    state.outbox_relay.wake()
+    logger.info(f"New request submitted with ID: {new_request.id} for user: {user.id}")
+    return JSONResponse({'request_id': new_request.id})
+
+
+@oauth_required
+async def submit_requests(request):
+    state = request.app.state
+    data = await request.json()
+    user = request.state.current_user
+    try:
+        queries = batch_queries(data, state.config.SUBMIT_BATCH_MAX_SIZE)
+    except InvalidBatch as e:
+        return JSONResponse({'message': str(e)}, 400)
+
+    async with state.sessionmaker() as session:
+        new_requests = [Request(user_query=query, user_id=user.id) for query in queries]
+        session.add_all(new_requests)
+        session.add_all([OutboxMessage(request=new_request) for new_request in new_requests])
+        await session.commit()
+    state.outbox_relay.wake()
+    request_ids = [new_request.id for new_request in new_requests]
+    logger.info(f"{len(request_ids)} requests submitted in batch for user: {user.id}")
+    return JSONResponse({'request_ids': request_ids})
+
+
+@oauth_required
+async def fetch_requests(request):
+    state = request.app.state
+    wait = min(max(query_arg(request, 'wait', float, 0), 0), state.config.FETCH_MAX_WAIT)
+    max_count = query_arg(request, 'max', int)
+
+    if max_count is not None:
+        max_count = min(max(max_count, 1), state.config.LEASE_MAX_BATCH_SIZE)
+        lease_id, lease_expires_at, leased_requests = await state.lease_service.lease(max_count, timeout=wait)
+        if leased_requests:
+            logger.info(f"Leased {len(leased_requests)} requests under lease: {lease_id}")
+            return JSONResponse({
+                'lease_id': lease_id,
+                'lease_expires_at': lease_expires_at.isoformat(),
+                'requests': [{'request_id': request_id, 'query': query} for request_id, query in leased_requests]
+            })
+        logger.info("No requests in queue")
+        return JSONResponse({'message': 'No requests in queue'}, 404)
+
+    message = await state.queue_service.get(timeout=wait)
+    if message:
+        await message.ack()
+        request_id, query = state.queue_service.decode(message)
+        logger.info(f"Request fetched with ID: {request_id}")
+        return JSONResponse({'request_id': request_id, 'query': query})
+    logger.info("No requests in queue")
+    return JSONResponse({'message': 'No requests in queue'}, 404)
+
+
+@oauth_required
+async def submit_result(request):
+    state = request.app.state
+    data = await request.json()
+    request_id = data['request_id']
+    lease_id = data.get('lease_id')
+    async with state.sessionmaker() as session:
+        # The lease is checked by the UPDATE itself, as in /submit-results
+        completed = (await session.execute(
+            complete_requests_statement({request_id: (data['result'], lease_id)})
+        )).scalars().all()
+        await session.commit()
+        exists = bool(completed) or await session.get(Request, request_id) is not None
+    if completed:
+        state.result_cache.pop(request_id)
+        await notify_results(state, [{'request_id': request_id, 'status': 'completed', 'result': data['result']}])
+        logger.info(f"Result submitted for request ID: {request_id}")
+        return JSONResponse({'message': 'Result submitted successfully'})
+    if lease_id and exists:
+        logger.warning(f"Stale lease {lease_id} used to submit result for request ID: {request_id}")
+        return JSONResponse({'message': 'Lease is no longer held'}, 409)
+    logger.warning(f"Attempt to submit result for non-existent request ID: {request_id}")
+    return JSONResponse({'message': 'Request not found'}, 404)
+
+
+@oauth_required
+async def submit_results(request):
+    state = request.app.state
+    try:
+        items = batch_results(await request.json(), state.config.SUBMIT_BATCH_MAX_SIZE)
+    except InvalidBatch as e:
+        return JSONResponse({'message': str(e)}, 400)
+
+    async with state.sessionmaker() as session:
+        leases = dict((await session.execute(
+            select(Request.id, Request.lease_id).where(Request.id.in_({item['request_id'] for item in items}))
+        )).all())
+
+        results = completable_results(items, leases)
+        completed = set()
+        if results:
+            # One UPDATE for the whole batch; it re-checks each lease, so a lease
+            # lost since the SELECT above is reported as expired, not overwritten
+            completed = set((await session.execute(complete_requests_statement(results))).scalars().all())
+            await session.commit()
+
+    if completed:
+        for request_id in completed:
+            state.result_cache.pop(request_id)
+        await notify_results(state, completed_events(results, completed))
+
+    logger.info(f"Results submitted in batch for {len(completed)} of {len(items)} requests")
+    return JSONResponse({'results': batch_outcomes(items, leases, completed)})
+
+
+def is_not_modified(request, etag):
+    # The check werkzeug's Response.make_conditional applies to a GET without
+    # Last-Modified, which get_result leaves out like its WSGI counterpart
+    if_none_match = request.headers.get('If-None-Match')
+    return if_none_match is not None and parse_etags(if_none_match).contains_weak(etag)
+
+
+@oauth_required
+async def get_result(request):
+    state = request.app.state
+    request_id = request.path_params['request_id']
+    cached = state.result_cache.get(request_id)
+    if cached is None:
+        async with state.sessionmaker() as session:
+            req = await session.get(Request, request_id)
+        if not req:
+            logger.warning(f"Attempt to get result for non-existent request ID: {request_id}")
+            return JSONResponse({'message': 'Request not found'}, 404)
+        cached = result_entry(req)
+        # Completed results never change unless resubmitted, which evicts them
+        if req.status == 'completed':
+            state.result_cache.set(request_id, cached)
+
+    headers = {
+        'ETag': quote_etag(cached['etag']),
+        'Cache-Control': 'private, no-cache'
+    }
+    if is_not_modified(request, cached['etag']):
+        logger.info(f"Result not modified for request ID: {request_id}")
+        return Response(status_code=304, headers=headers)
+
+    logger.info(f"Result retrieved for request ID: {request_id}")
+    return Response(json.dumps(cached['payload']), media_type='application/json', headers=headers)
+
+
+@oauth_required
+async def stream_results(request):
+    state = request.app.state
+    try:
+        request_ids = stream_request_ids(request.query_params.get('ids', ''), state.config.RESULT_STREAM_MAX_IDS)
+    except InvalidBatch as e:
+        return JSONResponse({'message': str(e)}, 400)
+
+    # Subscribe before reading the current state so no completion can slip in between
+    subscriber = state.result_notifier.subscribe(request_ids)
+    try:
+        initial_events = await find_result_events(state, request_ids)
+    except BaseException:
+        state.result_notifier.unsubscribe(subscriber, request_ids)
+        raise
+
+    heartbeat = state.config.RESULT_STREAM_HEARTBEAT
+    stream = ResultStream(request_ids, state.config.RESULT_STREAM_TIMEOUT)
+
+    async def generate():
+        try:
+            for event in initial_events:
+                yield stream.result(event)
+
+            while remaining := stream.remaining():
+                try:
+                    event = await asyncio.wait_for(subscriber.get(), min(heartbeat, remaining))
+                except asyncio.TimeoutError:
+                    yield stream.recheck(await find_result_events(state, sorted(stream.pending)))
+                    continue
+                if event['request_id'] in stream.pending:
+                    yield stream.result(event)
+
+            yield stream.end()
+        finally:
+            state.result_notifier.unsubscribe(subscriber, request_ids)
+
+    logger.info(f"Streaming results for {len(request_ids)} requests")
+    return StreamingResponse(generate(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+async def not_found_error(request, error):
+    return JSONResponse({'error': 'Not found'}, 404)
+
+
+async def invalid_json_error(request, error):
+    return JSONResponse({'error': 'Invalid JSON body'}, 400)
+
+
+async def broker_unavailable_error(request, error):
+    logger.error(f"Broker unavailable: {error}")
+    return JSONResponse({'error': 'Queue temporarily unavailable'}, 503,
+                        headers={'Retry-After': str(max(1, round(error.retry_after)))})
+
+
+async def internal_error(request, error):
+    logger.error(f"Server Error: {error}")
+    return JSONResponse({'error': 'Internal server error'}, 500)
+
+
+def create_asgi_app(config_class=Config):
+    app_logger = logging.getLogger('app')
+    if not app_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        app_logger.addHandler(handler)
+        app_logger.setLevel(logging.INFO)
+
+    engine = create_async_engine(
+        config_class.ASYNC_DATABASE_URL or async_database_url(config_class.SQLALCHEMY_DATABASE_URI)
+    )
+    sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+    queue_service = AsyncQueueService(config_class)
+    outbox_relay = AsyncOutboxRelay(config_class, sessionmaker, queue_service)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        tasks = [
+            asyncio.create_task(queue_service.connect()),
+            asyncio.create_task(outbox_relay.run()),
+            asyncio.create_task(app.state.lease_service.run_sweeper()),
+            asyncio.create_task(app.state.result_notifier.start()),
+        ]
+        try:
+            yield
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await queue_service.close()
+            await engine.dispose()
+
+    app = Starlette(
+        routes=[
+            Route('/submit-request', submit_request, methods=['POST']),
+            Route('/submit-requests', submit_requests, methods=['POST']),
+            Route('/fetch-requests', fetch_requests, methods=['GET']),
+            Route('/submit-result', submit_result, methods=['POST']),
+            Route('/submit-results', submit_results, methods=['POST']),
+            Route('/get-result/{request_id:int}', get_result, methods=['GET']),
+            Route('/stream-results', stream_results, methods=['GET']),
+        ],
+        exception_handlers={
+            404: not_found_error,
+            json.JSONDecodeError: invalid_json_error,
+            BrokerUnavailable: broker_unavailable_error,
+            Exception: internal_error,
+        },
+        lifespan=lifespan
+    )
+    app.state.config = config_class
+    app.state.engine = engine
+    app.state.sessionmaker = sessionmaker
+    app.state.queue_service = queue_service
+    app.state.outbox_relay = outbox_relay
+    app.state.lease_service = AsyncLeaseService(config_class, sessionmaker, queue_service, outbox_relay)
+    app.state.result_notifier = AsyncResultNotifier(config_class, queue_service)
+    app.state.result_cache = ExpiringLRUCache(maxsize=config_class.RESULT_CACHE_SIZE, ttl=config_class.RESULT_CACHE_TTL)
+    return app
@@ -0,0 +1,25 @@
+from app import db
+from datetime import datetime, timezone
+
+class OutboxMessage(db.Model):
+    """A request waiting to be published to the broker by the outbox relay.
+
+    Written in the same transaction as the change that requires the publish
+    and deleted once the relay has published it. A relay claims a batch by
+    setting ``claimed_by`` before publishing it, so other relays skip it.
+    """
+
+    __table_args__ = (
+        db.Index('ix_outbox_message_claimed_by', 'claimed_by'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    request_id = db.Column(db.Integer, db.ForeignKey('request.id'), nullable=False)
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    claimed_by = db.Column(db.String(36))
+    claimed_at = db.Column(db.DateTime(timezone=True))
+
+    request = db.relationship('Request')
+
+    def __repr__(self):
+        return f"<OutboxMessage {self.id} for Request {self.request_id}>"
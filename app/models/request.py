@@ -3,12 +3,21 @@ from datetime import datetime, timezone
 import uuid
 
 class Request(db.Model):
+    __table_args__ = (
+        # /requests keyset pagination per user, and status scans (pending
+        # counts, stuck or expired-lease jobs) ordered by age
+        db.Index('ix_request_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_request_status_created_at', 'status', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_query = db.Column(db.String(500), nullable=False)
     status = db.Column(db.String(20), default='pending')
     result = db.Column(db.Text)
-    created_at = db.Column(db.DateTime(timezone=True), default=datetime.now(timezone.utc))
-    updated_at = db.Column(db.DateTime(timezone=True), default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    lease_id = db.Column(db.String(36))
+    lease_expires_at = db.Column(db.DateTime(timezone=True))
     
     user_id = db.Column(db.UUID(as_uuid=True), db.ForeignKey('user.id'), nullable=False)
     user = db.relationship('User', back_populates='requests')
@@ -6,6 +6,7 @@ from urllib.parse import urlencode
 from app import db
 
 from app.models.user import User
+from app.utils.auth import invalidate_token, invalidate_user
 
 bp = Blueprint('auth', __name__)
 
@@ -13,6 +14,9 @@ bp = Blueprint('auth', __name__)
 @bp.route('/api/auth/logout', methods=['POST'])
 def logout():
     session.clear()
+    parts = request.headers.get('Authorization', '').split()
+    if len(parts) == 2 and parts[0].lower() == 'bearer':
+        invalidate_token(parts[1])
     return jsonify({"msg": "Logged out successfully"}), 200
 
 @bp.route('/api/auth/google', methods=['POST'])
@@ -26,7 +30,7 @@ def google_auth():
             return jsonify({"msg": "Missing authorization code"}), 400
 
         # Exchange the auth code for tokens
-        token_url = "https://oauth2.googleapis.com/token"
+        token_url = current_app.config['GOOGLE_OAUTH_TOKEN_URL']
         data = {
             'code': auth_code,
             'client_id': current_app.config['GOOGLE_OAUTH_CLIENT_ID'],
@@ -42,7 +46,7 @@ def google_auth():
         tokens = response.json()
 
         # Use the access token to get user info
-        user_info_response = requests.get('https://www.googleapis.com/oauth2/v3/userinfo', 
+        user_info_response = requests.get(current_app.config['GOOGLE_OAUTH_USERINFO_URL'], 
                                         headers={'Authorization': f"Bearer {tokens['access_token']}"})
 
         if user_info_response.status_code != 200:
@@ -82,6 +86,7 @@ def google_auth():
         # Update the user with the session token
         user.session_token = session_token
         db.session.commit()
+        invalidate_user(user.id)
 
         return jsonify({
             "session_token": session_token,
@@ -101,7 +106,7 @@ def github_auth():
         # current_app.logger.info(f"Auth code: {auth_code}")
         
 
-        token_exchange_url = 'https://github.com/login/oauth/access_token'
+        token_exchange_url = current_app.config['GITHUB_OAUTH_TOKEN_URL']
         token_exchange_headers = {
             "Accept": "application/json",
             "Accept-Encoding": "application/json",
@@ -124,7 +129,7 @@ def github_auth():
             return jsonify({"msg": "Missing access token"}), 400
 
         # Use the access token to get user info
-        user_info_url = 'https://api.github.com/user'
+        user_info_url = current_app.config['GITHUB_OAUTH_USERINFO_URL']
         headers = {
             'Authorization': f'Bearer {access_token}',
             'Accept': 'application/vnd.github+json',
@@ -167,6 +172,7 @@ def github_auth():
         # Update the user with the session token
         user.session_token = session_token
         db.session.commit()
+        invalidate_user(user.id)
         
         return jsonify({
             "session_token": session_token,
@@ -1,14 +1,84 @@
 import os
+import re
 import json
-from flask import Blueprint, jsonify, current_app, send_file, request
+from flask import Blueprint, Response, jsonify, current_app, send_file, request
 from app.utils.auth import oauth_required
+from app.utils.cache import ExpiringLRUCache
+from app.utils.log_archive import (
+    COMPRESSIONS, LogFile, compression_available, log_stream, read_spooled, representation_etag, slice_stream,
+    spool_stream
+)
+from app.utils.log_index import log_search, to_log_timestamp
 from flasgger import swag_from
 
 bp = Blueprint('logs', __name__)
 
+# Total length of each compressed/bundled download by ETag, so only the
+# first Range request for a selection has to spool it to learn its length
+download_lengths = ExpiringLRUCache(maxsize=256, ttl=24 * 60 * 60)
+
 @bp.route('/logs', methods=['GET'])
 @oauth_required
 @swag_from({
+    'parameters': [
+        {
+            'name': 'type',
+            'in': 'query',
+            'type': 'string',
+            'enum': ['error', 'warning', 'info'],
+            'default': 'info',
+            'required': False
+        },
+        {
+            'name': 'lines',
+            'in': 'query',
+            'type': 'integer',
+            'default': 100,
+            'required': False,
+            'description': 'Maximum number of entries to return (capped at LOGS_MAX_LINES)'
+        },
+        {
+            'name': 'since',
+            'in': 'query',
+            'type': 'string',
+            'format': 'date-time',
+            'required': False,
+            'description': 'Return the first matching entries at or after this ISO 8601 time (server local time unless an offset is given)'
+        },
+        {
+            'name': 'until',
+            'in': 'query',
+            'type': 'string',
+            'format': 'date-time',
+            'required': False,
+            'description': 'Only entries before this ISO 8601 time. Without since, the latest matching entries before it are returned'
+        },
+        {
+            'name': 'level',
+            'in': 'query',
+            'type': 'string',
+            'required': False
+        },
+        {
+            'name': 'module',
+            'in': 'query',
+            'type': 'string',
+            'required': False
+        },
+        {
+            'name': 'remote_addr',
+            'in': 'query',
+            'type': 'string',
+            'required': False
+        },
+        {
+            'name': 'q',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'Case-insensitive text to match in the message'
+        }
+    ],
     'responses': {
         200: {
             'description': 'Application logs',
@@ -56,26 +126,42 @@ bp = Blueprint('logs', __name__)
 def get_logs():
     log_type = request.args.get('type', 'info')
     lines = request.args.get('lines', 100, type=int)
+    lines = min(max(lines, 1), current_app.config['LOGS_MAX_LINES'])
 
     if log_type not in ['error', 'warning', 'info']:
         return jsonify({'error': 'Invalid log type'}), 400
 
-    log_file_path = os.path.join(current_app.root_path, '..', 'logs', f'{log_type}.log')
+    try:
+        since = to_log_timestamp(request.args['since']) if request.args.get('since') else None
+        until = to_log_timestamp(request.args['until']) if request.args.get('until') else None
+    except ValueError:
+        return jsonify({'error': 'since and until must be ISO 8601 times'}), 400
+
+    fields = {field: request.args[field] for field in ('level', 'module', 'remote_addr') if request.args.get(field)}
+    if 'level' in fields:
+        fields['level'] = fields['level'].upper()
+    text = request.args.get('q', '').lower()
+
+    def matches(entry):
+        if any(entry.get(field) != value for field, value in fields.items()):
+            return False
+        return not text or text in str(entry.get('message', '')).lower()
+
+    log_dir = os.path.join(current_app.root_path, '..', 'logs')
     
     try:
-        with open(log_file_path, 'r') as log_file:
-            logs = log_file.readlines()[-lines:]
-        
-        parsed_logs = [json.loads(log) for log in logs]
-        
+        parsed_logs, skipped = log_search.search(
+            log_dir, log_type, lines, since=since, until=until,
+            matches=matches if fields or text else None
+        )
+        if not parsed_logs and not log_search.log_files(log_dir, log_type):
+            current_app.logger.error(f"No {log_type} log files found in {log_dir}")
+            return jsonify({'error': 'Log file not found'}), 404
+
+        if skipped:
+            current_app.logger.warning(f"Skipped {skipped} malformed {log_type} log lines")
         current_app.logger.info(f"Retrieved {len(parsed_logs)} {log_type} log entries")
         return jsonify({'logs': parsed_logs}), 200
-    except FileNotFoundError:
-        current_app.logger.error(f"Log file not found at {log_file_path}")
-        return jsonify({'error': 'Log file not found'}), 404
-    except json.JSONDecodeError:
-        current_app.logger.error(f"Error parsing log file: {log_file_path}")
-        return jsonify({'error': 'Error parsing log file'}), 500
     except Exception as e:
         current_app.logger.error(f"Error reading log file: {str(e)}")
         return jsonify({'error': 'Error reading log file'}), 500
@@ -91,6 +177,23 @@ def get_logs():
             'enum': ['error', 'warning', 'info'],
             'default': 'info',
             'required': False
+        },
+        {
+            'name': 'files',
+            'in': 'query',
+            'type': 'string',
+            'default': 'current',
+            'required': False,
+            'description': 'current, all, or comma-separated rotation dates (YYYY-MM-DD). '
+                           'Several files are streamed as one tar archive'
+        },
+        {
+            'name': 'compress',
+            'in': 'query',
+            'type': 'string',
+            'enum': ['none', 'gzip', 'zstd'],
+            'default': 'none',
+            'required': False
         }
     ],
     'responses': {
@@ -100,6 +203,9 @@ def get_logs():
                 'application/octet-stream': {}
             }
         },
+        206: {
+            'description': 'Requested byte range of the download, for resuming'
+        },
         400: {
             'description': 'Bad request',
             'content': {
@@ -117,18 +223,85 @@ def get_logs():
 })
 def download_logs():
     log_type = request.args.get('type', 'info')
+    selection = request.args.get('files', 'current')
+    compress = request.args.get('compress', 'none')
 
     if log_type not in ['error', 'warning', 'info']:
         return jsonify({'error': 'Invalid log type'}), 400
+    if not compression_available(compress):
+        return jsonify({'error': f'Unsupported compression: {compress}'}), 400
+
+    log_dir = os.path.join(current_app.root_path, '..', 'logs')
+    log_file_path = os.path.join(log_dir, f'{log_type}.log')
 
-    log_file_path = os.path.join(current_app.root_path, '..', 'logs', f'{log_type}.log')
+    if selection == 'current':
+        paths = [log_file_path]
+    elif selection == 'all':
+        paths = log_search.log_files(log_dir, log_type)
+    else:
+        dates = selection.split(',')
+        if not all(re.fullmatch(r'\d{4}-\d{2}-\d{2}', date) for date in dates):
+            return jsonify({'error': 'files must be current, all or YYYY-MM-DD dates'}), 400
+        paths = [f'{log_file_path}.{date}' for date in dates]
     
     try:
-        current_app.logger.info(f"Downloading {log_type} log file")
-        return send_file(log_file_path, as_attachment=True, download_name=f'{log_type}.log')
+        files = [LogFile(path) for path in paths]
+        if not files:
+            raise FileNotFoundError(log_file_path)
+
+        if len(files) == 1 and compress == 'none':
+            current_app.logger.info(f"Downloading {files[0].name} log file")
+            return send_file(files[0].path, as_attachment=True, download_name=files[0].name, conditional=True)
+
+        extension = COMPRESSIONS[compress]['extension']
+        if len(files) > 1:
+            download_name = f'{log_type}-logs.tar{extension}'
+            mimetype = 'application/x-tar' if compress == 'none' else COMPRESSIONS[compress]['mimetype']
+        else:
+            download_name = f'{files[0].name}{extension}'
+            mimetype = COMPRESSIONS[compress]['mimetype']
+
+        etag = representation_etag(files, compress)
+        headers = {
+            'Content-Disposition': f'attachment; filename={download_name}',
+            'Accept-Ranges': 'bytes',
+            'ETag': f'"{etag}"'
+        }
+
+        byte_range = request.range
+        if_range = request.if_range
+        range_valid = if_range.etag == etag if (if_range.etag or if_range.date) else True
+        if byte_range and range_valid:
+            # The stream is deterministic for pinned files, so a resumed
+            # download regenerates it and skips to the requested offset
+            length = download_lengths.get(etag)
+            spool = None
+            if length is None:
+                spool, length = spool_stream(log_stream(files, compress))
+                download_lengths.set(etag, length)
+            bounds = byte_range.range_for_length(length)
+            if bounds is None:
+                if spool:
+                    spool.close()
+                return Response(status=416, headers={'Content-Range': f'bytes */{length}'})
+            start, stop = bounds
+            headers['Content-Range'] = f'bytes {start}-{stop - 1}/{length}'
+            headers['Content-Length'] = str(stop - start)
+            current_app.logger.info(f"Resuming {download_name} download at byte {start}")
+            if spool:
+                body = read_spooled(spool, start, stop)
+            else:
+                body = slice_stream(log_stream(files, compress), start, stop)
+            return Response(body, status=206, mimetype=mimetype, headers=headers)
+
+        length = download_lengths.get(etag)
+        if length is not None:
+            headers['Content-Length'] = str(length)
+        current_app.logger.info(f"Downloading {download_name} ({len(files)} files, {compress})")
+        return Response(log_stream(files, compress), mimetype=mimetype, headers=headers)
     except FileNotFoundError:
-        current_app.logger.error(f"Log file not found at {log_file_path}")
+        current_app.logger.error(f"Log file not found for {log_type} download: {selection}")
         return jsonify({'error': 'Log file not found'}), 404
     except Exception as e:
         current_app.logger.error(f"Error downloading log file: {str(e)}")
-        return jsonify({'error': 'Error downloading log file'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Error downloading log file'}), 500
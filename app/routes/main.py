@@ -1,13 +1,29 @@
-from flask import Blueprint, request, jsonify, current_app, session
+import base64
+import binascii
+import json
+import queue
+from datetime import datetime
+from flask import Blueprint, Response, request, jsonify, current_app, session, stream_with_context
 from app.models.request import Request
+from app.models.outbox import OutboxMessage
 from app import db
 from app.models.user import User
 from app.services.queue_service import queue_service
+from app.services.lease_service import complete_requests_statement, lease_service
+from app.services.outbox_service import outbox_relay
+from app.services.notification_service import result_notifier
 from functools import wraps
 from flasgger import swag_from
+from sqlalchemy import select, tuple_
 import requests
 
 from app.utils.auth import oauth_required
+from app.utils.cache import ExpiringLRUCache
+from app.utils.request_api import (
+    InvalidBatch, ResultStream, batch_outcomes, batch_queries, batch_results, completable_results,
+    completed_events, result_entry, result_events, stream_request_ids
+)
+from config import Config
 
 bp = Blueprint('main', __name__)
 
@@ -19,6 +35,45 @@ def session_required(f):
         return f(*args, **kwargs)
     return decorated
 
+# Completed results keyed by request ID; entries are evicted when a result is
+# resubmitted here and expire after RESULT_CACHE_TTL for resubmissions elsewhere
+result_cache = ExpiringLRUCache(maxsize=Config.RESULT_CACHE_SIZE, ttl=Config.RESULT_CACHE_TTL)
+
+def encode_cursor(row):
+    position = json.dumps([row.created_at.isoformat(), row.id])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        created_at, request_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(request_id)
+    except (TypeError, binascii.Error, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def serialize_request_row(row):
+    data = {
+        'id': row.id,
+        'user_query': row.user_query,
+        'status': row.status,
+        'created_at': row.created_at.isoformat(),
+        'updated_at': row.updated_at.isoformat()
+    }
+    if 'result' in row._fields:
+        data['result'] = row.result
+    return data
+
+def notify_results(events):
+    # Stream subscribers fall back to a periodic database check, so a failed
+    # notification must never fail the submission itself
+    try:
+        result_notifier.publish(events)
+    except Exception as e:
+        current_app.logger.error(f"Failed to publish result notifications: {str(e)}")
+
+def find_result_events(request_ids):
+    found = {req.id: req for req in Request.query.filter(Request.id.in_(request_ids)).all()}
+    return result_events(request_ids, found)
+
 @bp.route('/submit-request', methods=['POST'])
 @oauth_required
 @swag_from({
@@ -55,42 +110,203 @@ def submit_request():
     data = request.json
     user = request.current_user
     new_request = Request(user_query=data['query'], user_id=user.id)
-    db.session.add(new_request)
+    # Committed together, so the request is queued even if publishing fails now
+    db.session.add_all([new_request, OutboxMessage(request=new_request)])
     db.session.commit()
-    queue_service.enqueue(new_request)
+    outbox_relay.wake()
     current_app.logger.info(f"New request submitted with ID: {new_request.id} for user: {user.id}")
     return jsonify({'request_id': new_request.id}), 200
 
+@bp.route('/submit-requests', methods=['POST'])
+@oauth_required
+@swag_from({
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'queries': {
+                        'type': 'array',
+                        'items': {'type': 'string'},
+                        'description': 'User queries to be processed'
+                    }
+                },
+                'required': ['queries']
+            }
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Requests submitted successfully',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'request_ids': {
+                        'type': 'array',
+                        'items': {'type': 'integer'},
+                        'description': 'IDs of the submitted requests, in the order of the queries'
+                    }
+                }
+            }
+        },
+        400: {
+            'description': 'Invalid batch'
+        }
+    }
+})
+def submit_requests():
+    data = request.json
+    user = request.current_user
+    try:
+        queries = batch_queries(data, current_app.config['SUBMIT_BATCH_MAX_SIZE'])
+    except InvalidBatch as e:
+        return jsonify({'message': str(e)}), 400
+
+    new_requests = [Request(user_query=query, user_id=user.id) for query in queries]
+    db.session.add_all(new_requests)
+    db.session.add_all([OutboxMessage(request=new_request) for new_request in new_requests])
+    db.session.commit()
+    outbox_relay.wake()
+    request_ids = [new_request.id for new_request in new_requests]
+    current_app.logger.info(f"{len(request_ids)} requests submitted in batch for user: {user.id}")
+    return jsonify({'request_ids': request_ids}), 200
+
 @bp.route('/fetch-requests', methods=['GET'])
 @oauth_required
 @swag_from({
+    'parameters': [
+        {
+            'name': 'wait',
+            'in': 'query',
+            'type': 'number',
+            'required': False,
+            'description': 'Seconds to block waiting for a request when the queue is empty (capped at FETCH_MAX_WAIT)'
+        },
+        {
+            'name': 'max',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': 'Lease up to this many requests at once (capped at LEASE_MAX_BATCH_SIZE). '
+                           'Leased requests are redelivered if no result is submitted before the lease expires'
+        }
+    ],
     'responses': {
         200: {
-            'description': 'Latest queued request',
+            'description': 'Latest queued request, or a lease over several requests when max is given',
             'schema': {
                 'type': 'object',
                 'properties': {
                     'request_id': {'type': 'integer'},
-                    'query': {'type': 'string'}
+                    'query': {'type': 'string'},
+                    'lease_id': {'type': 'string'},
+                    'lease_expires_at': {'type': 'string', 'format': 'date-time'},
+                    'requests': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'request_id': {'type': 'integer'},
+                                'query': {'type': 'string'}
+                            }
+                        }
+                    }
                 }
             }
         }
     }
 })
 def fetch_requests():
-    request = queue_service.dequeue()
-    if request:
-        current_app.logger.info(f"Request fetched with ID: {request.id}")
-        return jsonify({'request_id': request.id, 'query': request.query}), 200
+    wait = request.args.get('wait', 0, type=float)
+    wait = min(max(wait, 0), current_app.config['FETCH_MAX_WAIT'])
+    max_count = request.args.get('max', type=int)
+
+    lease_service.maybe_sweep_expired()
+
+    if max_count is not None:
+        max_count = min(max(max_count, 1), current_app.config['LEASE_MAX_BATCH_SIZE'])
+        lease_id, lease_expires_at, leased_requests = lease_service.lease(max_count, timeout=wait)
+        if leased_requests:
+            current_app.logger.info(f"Leased {len(leased_requests)} requests under lease: {lease_id}")
+            return jsonify({
+                'lease_id': lease_id,
+                'lease_expires_at': lease_expires_at.isoformat(),
+                'requests': [{'request_id': req.id, 'query': req.query} for req in leased_requests]
+            }), 200
+        current_app.logger.info("No requests in queue")
+        return jsonify({'message': 'No requests in queue'}), 404
+
+    queued_request = queue_service.dequeue(timeout=wait)
+    if queued_request:
+        current_app.logger.info(f"Request fetched with ID: {queued_request.id}")
+        return jsonify({'request_id': queued_request.id, 'query': queued_request.query}), 200
     current_app.logger.info("No requests in queue")
     return jsonify({'message': 'No requests in queue'}), 404
 
 @bp.route('/requests', methods=['GET'])
 @oauth_required
 @swag_from({
+    'parameters': [
+        {
+            'name': 'limit',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': 'Page size (capped at REQUESTS_PAGE_MAX_SIZE). Without limit or cursor every matching '
+                           'request is streamed'
+        },
+        {
+            'name': 'cursor',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'next_cursor from the previous page'
+        },
+        {
+            'name': 'status',
+            'in': 'query',
+            'type': 'string',
+            'required': False
+        },
+        {
+            'name': 'since',
+            'in': 'query',
+            'type': 'string',
+            'format': 'date-time',
+            'required': False,
+            'description': 'Only requests created at or after this ISO 8601 time'
+        },
+        {
+            'name': 'until',
+            'in': 'query',
+            'type': 'string',
+            'format': 'date-time',
+            'required': False,
+            'description': 'Only requests created before this ISO 8601 time'
+        },
+        {
+            'name': 'include_result',
+            'in': 'query',
+            'type': 'boolean',
+            'default': True,
+            'required': False
+        },
+        {
+            'name': 'format',
+            'in': 'query',
+            'type': 'string',
+            'enum': ['json', 'ndjson'],
+            'default': 'json',
+            'required': False,
+            'description': 'ndjson returns one request per line; the next page cursor is then sent in X-Next-Cursor'
+        }
+    ],
     'responses': {
         200: {
-            'description': 'List of user\'s requests',
+            'description': 'List of user\'s requests, oldest first',
             'schema': {
                 'type': 'object',
                 'properties': {
@@ -107,27 +323,78 @@ def fetch_requests():
                                 'updated_at': {'type': 'string', 'format': 'date-time'}
                             }
                         }
-                    }
+                    },
+                    'next_cursor': {'type': 'string'}
                 }
             }
+        },
+        400: {
+            'description': 'Invalid filter or cursor'
         }
     }
 })
 def get_user_requests():
     user = request.current_user
-    user_requests = Request.query.filter_by(user_id=user.id).all()
-    
-    requests_data = [{
-        'id': req.id,
-        'user_query': req.user_query,
-        'status': req.status,
-        'result': req.result,
-        'created_at': req.created_at.isoformat(),
-        'updated_at': req.updated_at.isoformat()
-    } for req in user_requests]
-    
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    include_result = request.args.get('include_result', 'true').lower() != 'false'
+    output_format = request.args.get('format', 'json')
+
+    if output_format not in ('json', 'ndjson'):
+        return jsonify({'message': 'format must be json or ndjson'}), 400
+
+    columns = [Request.id, Request.user_query, Request.status, Request.created_at, Request.updated_at]
+    if include_result:
+        columns.append(Request.result)
+    query = select(*columns).where(Request.user_id == user.id)
+
+    try:
+        if request.args.get('status'):
+            query = query.where(Request.status == request.args['status'])
+        if request.args.get('since'):
+            query = query.where(Request.created_at >= datetime.fromisoformat(request.args['since']))
+        if request.args.get('until'):
+            query = query.where(Request.created_at < datetime.fromisoformat(request.args['until']))
+        if cursor:
+            created_at, request_id = decode_cursor(cursor)
+            query = query.where(tuple_(Request.created_at, Request.id) > tuple_(created_at, request_id))
+    except ValueError:
+        return jsonify({'message': 'Invalid since, until or cursor'}), 400
+    query = query.order_by(Request.created_at, Request.id)
+
+    if limit is not None or cursor:
+        limit = min(max(limit or current_app.config['REQUESTS_PAGE_MAX_SIZE'], 1),
+                    current_app.config['REQUESTS_PAGE_MAX_SIZE'])
+        rows = db.session.execute(query.limit(limit + 1)).all()
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        requests_data = [serialize_request_row(row) for row in rows[:limit]]
+        current_app.logger.info(f"User {user.id} retrieved a page of {len(requests_data)} requests")
+        if output_format == 'ndjson':
+            body = ''.join(json.dumps(item) + '\n' for item in requests_data)
+            headers = {'X-Next-Cursor': next_cursor} if next_cursor else {}
+            return Response(body, mimetype='application/x-ndjson', headers=headers)
+        return jsonify({'requests': requests_data, 'next_cursor': next_cursor}), 200
+
+    # Full export: rows are fetched yield_per at a time and written out in
+    # chunks, so memory stays flat however many requests the user has
+    batch_size = current_app.config['REQUESTS_STREAM_BATCH_SIZE']
+
+    def generate():
+        result = db.session.execute(query.execution_options(yield_per=batch_size))
+        if output_format == 'ndjson':
+            for partition in result.partitions():
+                yield ''.join(json.dumps(serialize_request_row(row)) + '\n' for row in partition)
+            return
+        yield '{"requests": ['
+        separator = ''
+        for partition in result.partitions():
+            yield separator + ', '.join(json.dumps(serialize_request_row(row)) for row in partition)
+            separator = ', '
+        yield ']}'
+
     current_app.logger.info(f"User {user.id} retrieved their requests")
-    return jsonify({'requests': requests_data}), 200
+    mimetype = 'application/x-ndjson' if output_format == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
 
 @bp.route('/submit-result', methods=['POST'])
 @oauth_required
@@ -147,6 +414,10 @@ def get_user_requests():
                     'result': {
                         'type': 'string',
                         'description': 'Processed result'
+                    },
+                    'lease_id': {
+                        'type': 'string',
+                        'description': 'Lease the request was fetched under, if any'
                     }
                 },
                 'required': ['request_id', 'result']
@@ -159,21 +430,108 @@ def get_user_requests():
         },
         404: {
             'description': 'Request not found'
+        },
+        409: {
+            'description': 'The lease expired and the request was handed to another worker'
         }
     }
 })
 def submit_result():
     data = request.json
-    req = Request.query.get(data['request_id'])
-    if req:
-        req.result = data['result']
-        req.status = 'completed'
-        db.session.commit()
-        current_app.logger.info(f"Result submitted for request ID: {req.id}")
+    request_id = data['request_id']
+    lease_id = data.get('lease_id')
+    # The lease is checked by the UPDATE itself, as in /submit-results
+    completed = db.session.execute(
+        complete_requests_statement({request_id: (data['result'], lease_id)})
+    ).scalars().all()
+    db.session.commit()
+    if completed:
+        result_cache.pop(request_id)
+        notify_results([{'request_id': request_id, 'status': 'completed', 'result': data['result']}])
+        current_app.logger.info(f"Result submitted for request ID: {request_id}")
         return jsonify({'message': 'Result submitted successfully'}), 200
-    current_app.logger.warning(f"Attempt to submit result for non-existent request ID: {data['request_id']}")
+    if lease_id and db.session.get(Request, request_id):
+        current_app.logger.warning(f"Stale lease {lease_id} used to submit result for request ID: {request_id}")
+        return jsonify({'message': 'Lease is no longer held'}), 409
+    current_app.logger.warning(f"Attempt to submit result for non-existent request ID: {request_id}")
     return jsonify({'message': 'Request not found'}), 404
 
+@bp.route('/submit-results', methods=['POST'])
+@oauth_required
+@swag_from({
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'results': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'request_id': {'type': 'integer'},
+                                'result': {'type': 'string'},
+                                'lease_id': {'type': 'string'}
+                            },
+                            'required': ['request_id', 'result']
+                        }
+                    }
+                },
+                'required': ['results']
+            }
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Per-item outcome, in the order of the submitted results',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'results': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'request_id': {'type': 'integer'},
+                                'status': {'type': 'string', 'enum': ['completed', 'not_found', 'lease_expired']}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        400: {
+            'description': 'Invalid batch'
+        }
+    }
+})
+def submit_results():
+    try:
+        items = batch_results(request.json, current_app.config['SUBMIT_BATCH_MAX_SIZE'])
+    except InvalidBatch as e:
+        return jsonify({'message': str(e)}), 400
+
+    leases = dict(db.session.execute(
+        select(Request.id, Request.lease_id).where(Request.id.in_({item['request_id'] for item in items}))
+    ).all())
+
+    results = completable_results(items, leases)
+    completed = set()
+    if results:
+        # One UPDATE for the whole batch; it re-checks each lease, so a lease
+        # lost since the SELECT above is reported as expired, not overwritten
+        completed = set(db.session.execute(complete_requests_statement(results)).scalars().all())
+        db.session.commit()
+        for request_id in completed:
+            result_cache.pop(request_id)
+        notify_results(completed_events(results, completed))
+
+    current_app.logger.info(f"Results submitted in batch for {len(completed)} of {len(items)} requests")
+    return jsonify({'results': batch_outcomes(items, leases, completed)}), 200
+
 @bp.route('/get-result/<int:request_id>', methods=['GET'])
 @oauth_required
 @swag_from({
@@ -197,13 +555,103 @@ def submit_result():
                     'request_id': {'type': 'integer'}
                 }
             }
+        },
+        304: {
+            'description': 'Result unchanged since the ETag in If-None-Match'
+        },
+        404: {
+            'description': 'Request not found'
         }
     }
 })
 def get_result(request_id):
-    req = Request.query.filter_by(id=request_id).first()
-    if req:
-        current_app.logger.info(f"Result retrieved for request ID: {request_id}")
-        return jsonify({'result': req.result, 'status': req.status, 'request_id': request_id}), 200
-    current_app.logger.warning(f"Attempt to get result for non-existent request ID: {request_id}")
-    return jsonify({'message': 'Request not found'}), 404
\ No newline at end of file
+    cached = result_cache.get(request_id)
+    if cached is None:
+        req = Request.query.filter_by(id=request_id).first()
+        if not req:
+            current_app.logger.warning(f"Attempt to get result for non-existent request ID: {request_id}")
+            return jsonify({'message': 'Request not found'}), 404
+        cached = result_entry(req)
+        # Completed results never change unless resubmitted, which evicts them
+        if req.status == 'completed':
+            result_cache.set(request_id, cached)
+
+    response = Response(mimetype='application/json')
+    # No Last-Modified: at one-second precision it would make If-Modified-Since
+    # answer 304 for a result completed later in the same second
+    response.set_etag(cached['etag'])
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.make_conditional(request)
+    if response.status_code == 304:
+        current_app.logger.info(f"Result not modified for request ID: {request_id}")
+        return response
+
+    response.set_data(current_app.json.dumps(cached['payload']))
+    current_app.logger.info(f"Result retrieved for request ID: {request_id}")
+    return response
+
+@bp.route('/stream-results', methods=['GET'])
+@oauth_required
+@swag_from({
+    'parameters': [
+        {
+            'name': 'ids',
+            'in': 'query',
+            'type': 'string',
+            'required': True,
+            'description': 'Comma-separated request IDs to follow (at most RESULT_STREAM_MAX_IDS)'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Server-Sent Events stream. Each "result" event carries request_id, status and '
+                           'result; the stream sends an "end" event once every request is completed or '
+                           'not found, or after RESULT_STREAM_TIMEOUT seconds'
+        },
+        400: {
+            'description': 'Invalid or missing request IDs'
+        }
+    }
+})
+def stream_results():
+    try:
+        request_ids = stream_request_ids(request.args.get('ids', ''), current_app.config['RESULT_STREAM_MAX_IDS'])
+    except InvalidBatch as e:
+        return jsonify({'message': str(e)}), 400
+
+    # Subscribe before reading the current state so no completion can slip in between
+    subscriber = result_notifier.subscribe(request_ids)
+    try:
+        initial_events = find_result_events(request_ids)
+    except Exception:
+        result_notifier.unsubscribe(subscriber, request_ids)
+        raise
+
+    app = current_app._get_current_object()
+    heartbeat = app.config['RESULT_STREAM_HEARTBEAT']
+    stream = ResultStream(request_ids, app.config['RESULT_STREAM_TIMEOUT'])
+
+    def generate():
+        try:
+            for event in initial_events:
+                yield stream.result(event)
+
+            while remaining := stream.remaining():
+                try:
+                    event = subscriber.get(timeout=min(heartbeat, remaining))
+                except queue.Empty:
+                    with app.app_context():
+                        events = find_result_events(sorted(stream.pending))
+                    yield stream.recheck(events)
+                    continue
+                if event['request_id'] in stream.pending:
+                    yield stream.result(event)
+
+            yield stream.end()
+        finally:
+            result_notifier.unsubscribe(subscriber, request_ids)
+
+    current_app.logger.info(f"Streaming results for {len(request_ids)} requests")
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
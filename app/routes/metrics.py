@@ -0,0 +1,8 @@
+from flask import Blueprint, Response
+from app.utils.metrics import registry
+
+bp = Blueprint('metrics', __name__)
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,76 @@
+import os
+from flask import Blueprint, jsonify, current_app, send_from_directory
+from app.utils.auth import oauth_required
+from app.utils.profiling import ProfileStore
+from flasgger import swag_from
+
+bp = Blueprint('profiles', __name__)
+
+def profile_store():
+    return ProfileStore(os.path.abspath(current_app.config['PROFILE_DIR']), current_app.config['PROFILE_MAX_FILES'])
+
+@bp.route('/profiles', methods=['GET'])
+@oauth_required
+@swag_from({
+    'responses': {
+        200: {
+            'description': 'Profiles captured by the request profiler, newest first. '
+                           '.prof files are cProfile stats (pstats, snakeviz); '
+                           '.folded files are collapsed stacks (flamegraph.pl, speedscope)',
+            'content': {
+                'application/json': {
+                    'schema': {
+                        'type': 'object',
+                        'properties': {
+                            'enabled': {'type': 'boolean'},
+                            'profiles': {
+                                'type': 'array',
+                                'items': {
+                                    'type': 'object',
+                                    'properties': {
+                                        'name': {'type': 'string'},
+                                        'size': {'type': 'integer'},
+                                        'created_at': {'type': 'number'}
+                                    }
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    }
+})
+def list_profiles():
+    return jsonify({
+        'enabled': current_app.config['PROFILING_ENABLED'],
+        'profiles': profile_store().list()
+    }), 200
+
+@bp.route('/profiles/<name>', methods=['GET'])
+@oauth_required
+@swag_from({
+    'parameters': [
+        {
+            'name': 'name',
+            'in': 'path',
+            'type': 'string',
+            'required': True
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Download a profile',
+            'content': {
+                'application/octet-stream': {}
+            }
+        },
+        404: {
+            'description': 'Profile not found'
+        }
+    }
+})
+def download_profile(name):
+    current_app.logger.info(f"Downloading profile {name}")
+    # send_from_directory rejects names that escape the profile directory
+    return send_from_directory(profile_store().directory, name, as_attachment=True)
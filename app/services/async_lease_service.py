@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import update
+
+from app.models.outbox import OutboxMessage
+from app.models.request import Request
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncLeaseService:
+    """asyncio counterpart of LeaseService, with the same lease semantics.
+
+    Expired leases are swept by a background task every LEASE_SWEEP_INTERVAL
+    instead of opportunistically from the fetch path.
+    """
+
+    def __init__(self, config, sessionmaker, queue_service, outbox_relay):
+        self.config = config
+        self.sessionmaker = sessionmaker
+        self.queue_service = queue_service
+        self.outbox_relay = outbox_relay
+
+    async def lease(self, max_count, timeout=None):
+        lease_id = str(uuid.uuid4())
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.config.LEASE_DURATION)
+
+        messages = await self.queue_service.get_batch(max_count, timeout)
+        if not messages:
+            return lease_id, expires_at, []
+        fetched = [self.queue_service.decode(message) for message in messages]
+        try:
+            # Messages for requests that are no longer pending (completed, or
+            # leased again after a redelivery) are acked and dropped here.
+            async with self.sessionmaker() as session:
+                leased_ids = set((await session.execute(
+                    update(Request)
+                    .where(Request.id.in_([request_id for request_id, query in fetched]), Request.status == 'pending')
+                    .values(status='processing', lease_id=lease_id, lease_expires_at=expires_at)
+                    .returning(Request.id)
+                )).scalars().all())
+                await session.commit()
+        except BaseException:
+            await asyncio.shield(asyncio.gather(
+                *(message.nack(requeue=True) for message in messages), return_exceptions=True
+            ))
+            raise
+        # Each message is acked on its own: a multiple=True ack would also ack
+        # messages held by other waiters on the shared channel
+        await asyncio.gather(*(message.ack() for message in messages))
+        return lease_id, expires_at, [(request_id, query) for request_id, query in fetched if request_id in leased_ids]
+
+    async def sweep_expired(self):
+        async with self.sessionmaker() as session:
+            expired = (await session.execute(
+                update(Request)
+                .where(Request.status == 'processing', Request.lease_expires_at < datetime.now(timezone.utc))
+                .values(status='pending', lease_id=None, lease_expires_at=None)
+                .returning(Request.id)
+            )).all()
+            session.add_all([OutboxMessage(request_id=row.id) for row in expired])
+            await session.commit()
+
+        if expired:
+            self.outbox_relay.wake()
+            logger.warning(f"Requeued {len(expired)} requests with expired leases")
+        return len(expired)
+
+    async def run_sweeper(self):
+        while True:
+            await asyncio.sleep(self.config.LEASE_SWEEP_INTERVAL)
+            try:
+                await self.sweep_expired()
+            except Exception as e:
+                logger.error(f"Lease sweep failed: {str(e)}")
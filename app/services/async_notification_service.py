@@ -0,0 +1,69 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+
+import aio_pika
+
+from app.services.notification_service import RESULTS_EXCHANGE
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncResultNotifier:
+    """asyncio counterpart of ResultNotifier, with the same backends.
+
+    With ``amqp`` the process consumes the ``request_results`` fanout exchange
+    that the WSGI processes publish to, so results submitted to either server
+    reach streams held by the other.
+    """
+
+    def __init__(self, config, queue_service, backend=None, max_pending_events=1000):
+        self.queue_service = queue_service
+        self.backend = backend or config.RESULT_NOTIFY_BACKEND
+        self.max_pending_events = max_pending_events
+        self.subscribers = defaultdict(set)
+
+    async def start(self):
+        if self.backend != 'amqp':
+            return
+        await self.queue_service.connected.wait()
+        channel = self.queue_service.channel
+        exchange = await channel.declare_exchange(RESULTS_EXCHANGE, aio_pika.ExchangeType.FANOUT)
+        # The robust channel re-declares, re-binds and re-consumes this queue
+        # after a reconnect
+        events = await channel.declare_queue(exclusive=True, auto_delete=True)
+        await events.bind(exchange)
+        await events.consume(self.on_message, no_ack=True)
+
+    async def on_message(self, message):
+        self.dispatch(json.loads(message.body))
+
+    def subscribe(self, request_ids):
+        subscriber = asyncio.Queue(maxsize=self.max_pending_events)
+        for request_id in request_ids:
+            self.subscribers[request_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber, request_ids):
+        for request_id in request_ids:
+            waiting = self.subscribers.get(request_id)
+            if waiting is None:
+                continue
+            waiting.discard(subscriber)
+            if not waiting:
+                del self.subscribers[request_id]
+
+    def dispatch(self, event):
+        for subscriber in list(self.subscribers.get(event['request_id'], ())):
+            try:
+                subscriber.put_nowait(event)
+            except asyncio.QueueFull:
+                logger.warning(f"Dropping result event for request ID {event['request_id']}: subscriber is full")
+
+    async def publish(self, events):
+        if self.backend == 'amqp':
+            await self.queue_service.publish_events(RESULTS_EXCHANGE, events)
+        else:
+            for event in events:
+                self.dispatch(event)
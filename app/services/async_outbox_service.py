@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import delete
+
+from app.models.outbox import OutboxMessage
+from app.services.outbox_service import claim_batch_statement, claimed_batch_query, release_claim_statement
+from app.services.queue_service import BrokerUnavailable
+from app.utils.metrics import outbox_publish_lag, outbox_published
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncOutboxRelay:
+    """asyncio counterpart of OutboxRelay: publishes the outbox table in batches.
+
+    Runs as a task of the ASGI process and drains the same table as the relays
+    of the WSGI processes; batches are claimed the same way, so they never
+    publish the same rows.
+    """
+
+    def __init__(self, config, sessionmaker, queue_service):
+        self.config = config
+        self.sessionmaker = sessionmaker
+        self.queue_service = queue_service
+        self.wakeup = asyncio.Event()
+
+    def wake(self):
+        self.wakeup.set()
+
+    async def run(self):
+        while True:
+            try:
+                published = await self.relay_batch()
+            except BrokerUnavailable as e:
+                logger.warning(f"Outbox relay paused, broker unavailable: {str(e)}")
+                await asyncio.sleep(max(e.retry_after, self.config.OUTBOX_POLL_INTERVAL))
+                continue
+            except Exception as e:
+                logger.error(f"Outbox relay failed, retrying: {str(e)}")
+                await asyncio.sleep(self.config.OUTBOX_RETRY_DELAY)
+                continue
+            if published < self.config.OUTBOX_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), self.config.OUTBOX_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
+
+    async def relay_batch(self):
+        claim_id = str(uuid.uuid4())
+        async with self.sessionmaker() as session:
+            await session.execute(claim_batch_statement(claim_id, self.config.OUTBOX_BATCH_SIZE, self.config.OUTBOX_CLAIM_TIMEOUT))
+            rows = (await session.execute(claimed_batch_query(claim_id))).all()
+            await session.commit()
+            if not rows:
+                return 0
+
+            try:
+                await self.queue_service.enqueue_many([(row.request_id, row.user_query) for row in rows])
+            except BaseException:
+                # Hand the batch back now rather than after OUTBOX_CLAIM_TIMEOUT
+                await asyncio.shield(self.release(claim_id))
+                raise
+            await session.execute(delete(OutboxMessage).where(OutboxMessage.claimed_by == claim_id))
+            await session.commit()
+
+        oldest = rows[0].created_at
+        if oldest.tzinfo is None:
+            # SQLite returns naive datetimes for timezone-aware columns
+            oldest = oldest.replace(tzinfo=timezone.utc)
+        outbox_publish_lag.observe((datetime.now(timezone.utc) - oldest).total_seconds())
+        outbox_published.inc(amount=len(rows))
+        logger.info(f"Outbox relay published {len(rows)} requests")
+        return len(rows)
+
+    async def release(self, claim_id):
+        async with self.sessionmaker() as session:
+            await session.execute(release_claim_statement(claim_id))
+            await session.commit()
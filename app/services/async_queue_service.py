@@ -0,0 +1,181 @@
+import asyncio
+import json
+import logging
+from collections import deque
+
+import aio_pika
+
+from app.services.queue_service import REQUEST_QUEUE, BrokerUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean the broker connection is down; the robust connection
+# reconnects (and re-declares the queue) on its own in the background
+BROKER_ERRORS = (
+    aio_pika.exceptions.AMQPConnectionError,
+    aio_pika.exceptions.ChannelInvalidStateError,
+    ConnectionError,
+)
+
+
+class AsyncQueueService:
+    """asyncio counterpart of QueueService for the ASGI entry point.
+
+    Holds one robust connection per process with a publisher-confirm channel.
+    Publishes in a batch are sent together and their confirms awaited together,
+    so a batch costs about one round trip. Long-polling fetches do not each
+    open a consumer: waiters are queued in process and a single consumer,
+    running only while someone waits, hands each delivery to the oldest one.
+    """
+
+    def __init__(self, config, connect_retry_delay=None):
+        self.config = config
+        self.connect_retry_delay = connect_retry_delay or config.BROKER_RESET_TIMEOUT
+        self.connection = None
+        self.channel = None
+        self.request_queue = None
+        self.declared_exchanges = {}
+        self.waiters = deque()
+        self.consumer_tag = None
+        self.consumer_lock = asyncio.Lock()
+        self.connected = asyncio.Event()
+
+    async def connect(self):
+        # Retries until the broker is reachable; meanwhile calls raise
+        # BrokerUnavailable, and submissions wait in the outbox
+        while True:
+            try:
+                self.connection = await aio_pika.connect_robust(
+                    host=self.config.RABBITMQ_HOST,
+                    port=int(self.config.RABBITMQ_PORT or 5672),
+                    login=self.config.RABBITMQ_USER,
+                    password=self.config.RABBITMQ_PASS,
+                    timeout=self.config.BROKER_CONNECT_TIMEOUT,
+                    heartbeat=self.config.BROKER_HEARTBEAT
+                )
+                self.channel = await self.connection.channel(publisher_confirms=True)
+                # The consumer feeds one waiter per message, and the rest of a
+                # batch is fetched with basic.get; a larger prefetch would pull
+                # messages with no waiter, only to requeue them
+                await self.channel.set_qos(prefetch_count=1)
+                self.request_queue = await self.channel.declare_queue(REQUEST_QUEUE, durable=True)
+                self.connected.set()
+                return
+            except (*BROKER_ERRORS, OSError, asyncio.TimeoutError) as e:
+                logger.error(f"Broker connection failed, retrying in {self.connect_retry_delay}s: {str(e)}")
+                await asyncio.sleep(self.connect_retry_delay)
+
+    async def close(self):
+        if self.connection:
+            await self.connection.close()
+
+    def check_available(self):
+        if not self.connected.is_set() or self.connection.is_closed:
+            raise BrokerUnavailable("Broker connection is down", self.connect_retry_delay)
+
+    async def enqueue_many(self, requests):
+        # `requests` are (request_id, query) pairs
+        self.check_available()
+        try:
+            await asyncio.gather(*(
+                self.channel.default_exchange.publish(
+                    aio_pika.Message(
+                        json.dumps({'id': request_id, 'query': query}).encode(),
+                        delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+                    ),
+                    routing_key=REQUEST_QUEUE
+                )
+                for request_id, query in requests
+            ))
+        except BROKER_ERRORS as e:
+            raise BrokerUnavailable(f"Broker connection lost: {str(e)}", self.connect_retry_delay) from e
+
+    async def publish_events(self, exchange_name, events):
+        self.check_available()
+        try:
+            exchange = self.declared_exchanges.get(exchange_name)
+            if exchange is None:
+                exchange = await self.channel.declare_exchange(exchange_name, aio_pika.ExchangeType.FANOUT)
+                self.declared_exchanges[exchange_name] = exchange
+            await asyncio.gather(*(
+                exchange.publish(aio_pika.Message(json.dumps(event).encode()), routing_key='', mandatory=False)
+                for event in events
+            ))
+        except BROKER_ERRORS as e:
+            raise BrokerUnavailable(f"Broker connection lost: {str(e)}", self.connect_retry_delay) from e
+
+    async def get(self, timeout=None):
+        """Return one unacknowledged message, waiting up to ``timeout`` seconds for it.
+
+        The caller must ack or nack the message.
+        """
+        self.check_available()
+        try:
+            message = await self.request_queue.get(no_ack=False, fail=False)
+            if message or not timeout:
+                return message
+
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await self.update_consumer()
+                return await asyncio.wait_for(waiter, timeout)
+            except asyncio.TimeoutError:
+                # The delivery can land just as the timeout fires; the message
+                # is then ours, and dropping it would leave it unacked
+                if waiter.done() and not waiter.cancelled():
+                    return waiter.result()
+                return None
+            except asyncio.CancelledError:
+                # The client went away after a message was handed over
+                if waiter.done() and not waiter.cancelled():
+                    await asyncio.shield(waiter.result().nack(requeue=True))
+                raise
+            finally:
+                try:
+                    self.waiters.remove(waiter)
+                except ValueError:
+                    pass
+                await asyncio.shield(self.update_consumer())
+        except BROKER_ERRORS as e:
+            raise BrokerUnavailable(f"Broker connection lost: {str(e)}", self.connect_retry_delay) from e
+
+    async def get_batch(self, max_count, timeout=None):
+        message = await self.get(timeout)
+        messages = [message] if message else []
+        try:
+            while messages and len(messages) < max_count:
+                message = await self.request_queue.get(no_ack=False, fail=False)
+                if message is None:
+                    break
+                messages.append(message)
+        except BROKER_ERRORS as e:
+            raise BrokerUnavailable(f"Broker connection lost: {str(e)}", self.connect_retry_delay) from e
+        return messages
+
+    async def update_consumer(self):
+        # Consume only while there are waiters, so idle processes do not hold
+        # prefetched messages other processes could be serving
+        async with self.consumer_lock:
+            if self.waiters and self.consumer_tag is None:
+                self.consumer_tag = await self.request_queue.consume(self.deliver, no_ack=False)
+            elif not self.waiters and self.consumer_tag is not None:
+                consumer_tag, self.consumer_tag = self.consumer_tag, None
+                try:
+                    await self.request_queue.cancel(consumer_tag)
+                except BROKER_ERRORS:
+                    pass
+
+    async def deliver(self, message):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(message)
+                return
+        # Every waiter timed out in the meantime
+        await message.nack(requeue=True)
+
+    @staticmethod
+    def decode(message):
+        data = json.loads(message.body)
+        return data['id'], data['query']
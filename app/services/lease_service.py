@@ -0,0 +1,104 @@
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+
+from flask import current_app
+from sqlalchemy import case, or_, tuple_, update
+
+from app import db
+from app.models.outbox import OutboxMessage
+from app.models.request import Request
+from app.services.outbox_service import outbox_relay
+from app.services.queue_service import queue_service
+
+
+def complete_requests_statement(results):
+    """UPDATE that completes the requests in ``results`` and returns the IDs it completed.
+
+    ``results`` maps request ID -> (result, lease_id). A request submitted with a
+    lease_id is only completed if it still holds that lease, checked by the
+    UPDATE itself, so a sweep that re-leases it after the caller read the lease
+    cannot have the new holder's result overwritten.
+    """
+    leased = [(request_id, lease_id) for request_id, (result, lease_id) in results.items() if lease_id]
+    unleased = [request_id for request_id, (result, lease_id) in results.items() if not lease_id]
+    conditions = []
+    if leased:
+        conditions.append(tuple_(Request.id, Request.lease_id).in_(leased))
+    if unleased:
+        conditions.append(Request.id.in_(unleased))
+    return (
+        update(Request)
+        .where(or_(*conditions))
+        .values(
+            result=case({request_id: result for request_id, (result, lease_id) in results.items()}, value=Request.id),
+            status='completed',
+            lease_id=None,
+            lease_expires_at=None
+        )
+        .returning(Request.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+class LeaseService:
+    """Hands out queued requests to workers under a time-limited lease.
+
+    A leased request is marked ``processing`` in the database before its queue
+    message is acked, so a worker that dies mid-batch only delays the job: once
+    the lease expires the sweep puts it back on the queue.
+    """
+
+    def __init__(self):
+        self.last_sweep = 0.0
+        self.lock = Lock()
+
+    def lease(self, max_count, timeout=None):
+        lease_id = str(uuid.uuid4())
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=current_app.config['LEASE_DURATION'])
+
+        with queue_service.fetch_batch(max_count, timeout=timeout) as fetched:
+            if not fetched:
+                return lease_id, expires_at, []
+
+            # Messages for requests that are no longer pending (completed, or
+            # leased again after a redelivery) are acked and dropped here.
+            leased_ids = db.session.execute(
+                update(Request)
+                .where(Request.id.in_([req.id for req in fetched]), Request.status == 'pending')
+                .values(status='processing', lease_id=lease_id, lease_expires_at=expires_at)
+                .returning(Request.id)
+            ).scalars().all()
+            db.session.commit()
+
+        leased_ids = set(leased_ids)
+        return lease_id, expires_at, [req for req in fetched if req.id in leased_ids]
+
+    def sweep_expired(self):
+        expired = db.session.execute(
+            update(Request)
+            .where(Request.status == 'processing', Request.lease_expires_at < datetime.now(timezone.utc))
+            .values(status='pending', lease_id=None, lease_expires_at=None)
+            .returning(Request.id)
+        ).all()
+        db.session.add_all([OutboxMessage(request_id=row.id) for row in expired])
+        db.session.commit()
+
+        if expired:
+            outbox_relay.wake()
+            current_app.logger.warning(f"Requeued {len(expired)} requests with expired leases")
+        return len(expired)
+
+    def maybe_sweep_expired(self):
+        # Sweeps run opportunistically from the fetch path, at most once per
+        # LEASE_SWEEP_INTERVAL per process.
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_sweep < current_app.config['LEASE_SWEEP_INTERVAL']:
+                return 0
+            self.last_sweep = now
+        return self.sweep_expired()
+
+
+lease_service = LeaseService()
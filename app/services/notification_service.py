@@ -0,0 +1,100 @@
+import json
+import logging
+import queue
+import time
+from collections import defaultdict
+from threading import Lock, Thread
+
+import pika
+
+from config import Config
+
+
+RESULTS_EXCHANGE = 'request_results'
+
+logger = logging.getLogger(__name__)
+
+
+class ResultNotifier:
+    """Pushes request status changes to in-process subscribers.
+
+    With the ``local`` backend events only reach subscribers in the process
+    that committed the result. With ``amqp`` every event goes through the
+    ``request_results`` fanout exchange, and each process runs one background
+    consumer that feeds its own subscribers, so results submitted to any
+    gunicorn worker reach streams held by any other.
+    """
+
+    def __init__(self, backend=None, max_pending_events=1000, reconnect_delay=5):
+        self.backend = backend or Config.RESULT_NOTIFY_BACKEND
+        self.max_pending_events = max_pending_events
+        self.reconnect_delay = reconnect_delay
+        self.subscribers = defaultdict(set)
+        self.lock = Lock()
+        self.bridge_thread = None
+
+    def subscribe(self, request_ids):
+        if self.backend == 'amqp':
+            self.start_bridge()
+        subscriber = queue.Queue(maxsize=self.max_pending_events)
+        with self.lock:
+            for request_id in request_ids:
+                self.subscribers[request_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber, request_ids):
+        with self.lock:
+            for request_id in request_ids:
+                waiting = self.subscribers.get(request_id)
+                if waiting is None:
+                    continue
+                waiting.discard(subscriber)
+                if not waiting:
+                    del self.subscribers[request_id]
+
+    def dispatch(self, event):
+        with self.lock:
+            waiting = list(self.subscribers.get(event['request_id'], ()))
+        for subscriber in waiting:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                logger.warning(f"Dropping result event for request ID {event['request_id']}: subscriber is full")
+
+    def publish(self, events):
+        if self.backend == 'amqp':
+            from app.services.queue_service import queue_service
+            queue_service.publish_events(RESULTS_EXCHANGE, events)
+        else:
+            for event in events:
+                self.dispatch(event)
+
+    def start_bridge(self):
+        with self.lock:
+            if self.bridge_thread and self.bridge_thread.is_alive():
+                return
+            self.bridge_thread = Thread(target=self.run_bridge, name='result-notifier', daemon=True)
+            self.bridge_thread.start()
+
+    def run_bridge(self):
+        from app.services.queue_service import queue_service
+
+        while True:
+            try:
+                connection = queue_service.create_connection()
+                channel = connection.channel()
+                channel.exchange_declare(exchange=RESULTS_EXCHANGE, exchange_type='fanout')
+                declared = channel.queue_declare(queue='', exclusive=True, auto_delete=True)
+                channel.queue_bind(exchange=RESULTS_EXCHANGE, queue=declared.method.queue)
+                channel.basic_consume(
+                    queue=declared.method.queue,
+                    on_message_callback=lambda ch, method, properties, body: self.dispatch(json.loads(body)),
+                    auto_ack=True
+                )
+                channel.start_consuming()
+            except pika.exceptions.AMQPError as e:
+                logger.error(f"Result notification consumer failed, reconnecting: {str(e)}")
+                time.sleep(self.reconnect_delay)
+
+
+result_notifier = ResultNotifier()
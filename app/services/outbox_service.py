@@ -0,0 +1,155 @@
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from threading import Event, Lock, Thread
+
+from flask import current_app
+from sqlalchemy import delete, or_, select, update
+
+from app import db
+from app.models.outbox import OutboxMessage
+from app.models.request import Request
+from app.services.queue_service import BrokerUnavailable, queue_service
+from app.utils.metrics import outbox_publish_lag, outbox_published
+
+
+def claim_batch_statement(claim_id, batch_size, claim_timeout):
+    """UPDATE that claims up to ``batch_size`` unclaimed outbox rows for ``claim_id``.
+
+    The claim is a single UPDATE, which SQLite serializes and Postgres
+    re-checks against concurrent claims, so two relays never claim the same
+    row. A claim older than ``claim_timeout`` seconds is from a relay that
+    died before deleting its batch, and is taken over.
+    """
+    now = datetime.now(timezone.utc)
+    claimable = or_(
+        OutboxMessage.claimed_by.is_(None),
+        OutboxMessage.claimed_at < now - timedelta(seconds=claim_timeout)
+    )
+    candidates = (
+        select(OutboxMessage.id)
+        .where(claimable)
+        .order_by(OutboxMessage.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        update(OutboxMessage)
+        .where(OutboxMessage.id.in_(candidates.scalar_subquery()), claimable)
+        .values(claimed_by=claim_id, claimed_at=now)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def release_claim_statement(claim_id):
+    return (
+        update(OutboxMessage)
+        .where(OutboxMessage.claimed_by == claim_id)
+        .values(claimed_by=None, claimed_at=None)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def claimed_batch_query(claim_id):
+    return (
+        select(OutboxMessage.id, OutboxMessage.created_at, Request.id.label('request_id'), Request.user_query)
+        .join(Request, OutboxMessage.request_id == Request.id)
+        .where(OutboxMessage.claimed_by == claim_id)
+        .order_by(OutboxMessage.id)
+    )
+
+
+class OutboxRelay:
+    """Publishes the requests recorded in the outbox table to the broker.
+
+    Routes add an OutboxMessage in the same transaction as the Request it
+    refers to, so every committed request is eventually queued, even if the
+    process dies right after the commit or the broker is down. Each process
+    runs one daemon thread that drains the table in batches. Each batch is
+    claimed in its own short transaction before it is published, so the
+    relays of several gunicorn workers and the ASGI process can drain it side
+    by side, on SQLite too. Delivery is at least once: if the process dies
+    between publishing a batch and deleting it, the claim goes stale after
+    OUTBOX_CLAIM_TIMEOUT and the batch is published again.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.pid = None
+        self.lock = Lock()
+        self.wakeup = Event()
+
+    def ensure_started(self, app):
+        # Called on every request: starts this process's relay thread, also
+        # after a fork
+        pid = os.getpid()
+        if pid == self.pid:
+            return
+        with self.lock:
+            if pid == self.pid:
+                return
+            self.pid = pid
+            self.app = app
+            self.wakeup = Event()
+            Thread(target=self.run, name='outbox-relay', daemon=True).start()
+
+    def wake(self):
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    published = self.relay_batch()
+            except BrokerUnavailable as e:
+                # Submissions keep landing in the outbox meanwhile; wait until
+                # the circuit lets a trial publish through
+                self.app.logger.warning(f"Outbox relay paused, broker unavailable: {str(e)}")
+                time.sleep(max(e.retry_after, self.app.config['OUTBOX_POLL_INTERVAL']))
+                continue
+            except Exception as e:
+                self.app.logger.error(f"Outbox relay failed, retrying: {str(e)}")
+                time.sleep(self.app.config['OUTBOX_RETRY_DELAY'])
+                continue
+            if published < self.app.config['OUTBOX_BATCH_SIZE']:
+                self.wakeup.wait(self.app.config['OUTBOX_POLL_INTERVAL'])
+                self.wakeup.clear()
+
+    def relay_batch(self):
+        claim_id = str(uuid.uuid4())
+        try:
+            db.session.execute(claim_batch_statement(
+                claim_id, current_app.config['OUTBOX_BATCH_SIZE'], current_app.config['OUTBOX_CLAIM_TIMEOUT']
+            ))
+            rows = db.session.execute(claimed_batch_query(claim_id)).all()
+            # Commit the claim before publishing, so no transaction (or SQLite
+            # write lock) is held while waiting on the broker
+            db.session.commit()
+            if not rows:
+                return 0
+
+            try:
+                queue_service.enqueue_many([Request(id=row.request_id, user_query=row.user_query) for row in rows])
+            except Exception:
+                # Hand the batch back now rather than after OUTBOX_CLAIM_TIMEOUT
+                db.session.execute(release_claim_statement(claim_id))
+                db.session.commit()
+                raise
+            db.session.execute(delete(OutboxMessage).where(OutboxMessage.claimed_by == claim_id))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        oldest = rows[0].created_at
+        if oldest.tzinfo is None:
+            # SQLite returns naive datetimes for timezone-aware columns
+            oldest = oldest.replace(tzinfo=timezone.utc)
+        outbox_publish_lag.observe((datetime.now(timezone.utc) - oldest).total_seconds())
+        outbox_published.inc(amount=len(rows))
+        current_app.logger.info(f"Outbox relay published {len(rows)} requests")
+        return len(rows)
+
+
+outbox_relay = OutboxRelay()
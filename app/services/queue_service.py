@@ -1,11 +1,21 @@
 import pika
 import json
+import logging
+import os
 import time
 from app.models.request import Request
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpen
+from app.utils.metrics import (
+    queue_channels_opened, queue_checkout_timeouts, queue_checkout_wait, queue_circuit_rejections,
+    queue_connection_recreations, queue_connections_evicted, queue_topology_declarations, registry
+)
+from app.utils.timing import record_phase, timed
 from config import Config
-from threading import Lock
+from threading import Condition, Lock, Thread
 from contextlib import contextmanager
 
+logger = logging.getLogger(__name__)
+
 
 # class QueueService:
 
@@ -25,89 +35,347 @@ from contextlib import contextmanager
 #     def dequeue(self):
 #         return None
 
+# Errors that mean the broker (or our connection to it) is gone, as opposed to
+# a channel-level error such as a declare with mismatched arguments
+BROKER_ERRORS = (pika.exceptions.AMQPConnectionError, pika.exceptions.ConnectionWrongStateError)
+
+REQUEST_QUEUE = 'request_queue'
+
+
+class BrokerUnavailable(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PoolExhausted(BrokerUnavailable):
+    pass
+
+
+class PooledConnection:
+    """A broker connection with the long-lived channels QueueService uses on it.
+
+    ``channel`` is in publisher-confirm mode: a single publish returns once the
+    broker has confirmed it, one round trip. ``batch_channel`` is opened on
+    first use in transaction mode, so a batch of publishes is pipelined and
+    confirmed by one tx_commit (a channel cannot be in both modes). The queue
+    topology is declared when the connection is opened, so a reconnect, which
+    opens a new PooledConnection, declares it again.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = self.last_used = time.monotonic()
+        self.channel = self.open_channel()
+        self.channel.confirm_delivery()
+        # Long-poll consumers get one message at a time
+        self.channel.basic_qos(prefetch_count=1)
+        self.batch_channel = None
+        self.declared_exchanges = set()
+        self.channel.queue_declare(queue=REQUEST_QUEUE, durable=True)
+        queue_topology_declarations.inc()
+
+    def open_channel(self):
+        channel = self.connection.channel()
+        queue_channels_opened.inc()
+        return channel
+
+    def transactional_channel(self):
+        if self.batch_channel is None:
+            self.batch_channel = self.open_channel()
+            self.batch_channel.tx_select()
+        return self.batch_channel
+
+    def declare_exchange(self, exchange):
+        if exchange not in self.declared_exchanges:
+            self.channel.exchange_declare(exchange=exchange, exchange_type='fanout')
+            self.declared_exchanges.add(exchange)
+
+    @property
+    def is_open(self):
+        # A channel-level error closes only that channel; the connection is then
+        # not reused, so every pooled connection has a working set of channels
+        return (self.connection.is_open and self.channel.is_open
+                and (self.batch_channel is None or self.batch_channel.is_open))
+
+    def close(self):
+        if self.connection.is_open:
+            try:
+                self.connection.close()
+            except pika.exceptions.AMQPError:
+                pass
+
+
 class QueueService:
-    def __init__(self, max_connections=5, max_retries=3, retry_delay=5):
-        self.max_connections = max_connections
-        self.max_retries = max_retries
-        self.retry_delay = retry_delay
+    """Publishes and fetches requests over a bounded, per-process connection pool.
+
+    At most ``max_connections`` connections are open at once; a checkout waits
+    up to BROKER_CHECKOUT_TIMEOUT for one to be returned. The pool starts empty
+    in every process, including gunicorn workers forked after it was used,
+    and each process runs a maintenance thread that services the heartbeats of
+    idle connections and closes those idle for longer than BROKER_IDLE_TIMEOUT
+    or older than BROKER_MAX_LIFETIME.
+    """
+
+    def __init__(self, max_connections=None):
+        self.max_connections = max_connections or Config.BROKER_POOL_SIZE
+        self.pid = None
+        self.reset_pool()
+        # Connections inherited over a fork share their sockets with the parent,
+        # so the child starts over instead of using (or closing) them
+        os.register_at_fork(after_in_child=self.reset_pool)
+
+    def reset_pool(self):
         self.connections = []
+        self.in_use = 0
         self.lock = Lock()
+        self.available = Condition(self.lock)
+        # Broker operations fail fast while the circuit is open instead of each
+        # one blocking a worker thread on its own connection attempts
+        self.breaker = CircuitBreaker(Config.BROKER_FAILURE_THRESHOLD, Config.BROKER_RESET_TIMEOUT)
+
+    def ensure_process(self):
+        # Called on every checkout: starts this process's maintenance thread
+        pid = os.getpid()
+        if pid == self.pid:
+            return
+        with self.lock:
+            if pid == self.pid:
+                return
+            self.pid = pid
+            Thread(target=self.run_maintenance, name='queue-pool-maintenance', daemon=True).start()
 
     def get_connection_params(self):
         return pika.ConnectionParameters(
             host=Config.RABBITMQ_HOST,
             port=Config.RABBITMQ_PORT,
             credentials=pika.PlainCredentials(Config.RABBITMQ_USER, Config.RABBITMQ_PASS),
-            heartbeat=60,  # Reduced heartbeat interval
-            blocked_connection_timeout=300
+            heartbeat=Config.BROKER_HEARTBEAT,
+            blocked_connection_timeout=300,
+            # A single, bounded attempt: retrying is the circuit breaker's job
+            connection_attempts=1,
+            socket_timeout=Config.BROKER_CONNECT_TIMEOUT
         )
 
     def create_connection(self):
-        for attempt in range(self.max_retries):
-            try:
-                return pika.BlockingConnection(self.get_connection_params())
-            except pika.exceptions.AMQPConnectionError as e:
-                if attempt == self.max_retries - 1:
-                    raise
-                time.sleep(self.retry_delay)
+        return pika.BlockingConnection(self.get_connection_params())
 
     @contextmanager
     def get_connection(self):
-        with self.lock:
-            if self.connections:
-                connection = self.connections.pop()
-            else:
-                connection = self.create_connection()
+        # Yields an open PooledConnection, or raises BrokerUnavailable without
+        # waiting if the circuit is open or the broker cannot be reached. A
+        # connection is only returned to the pool if it and its channels are
+        # still open.
+        self.ensure_process()
+        try:
+            self.breaker.before_call()
+        except CircuitOpen as e:
+            queue_circuit_rejections.inc()
+            raise BrokerUnavailable(str(e), e.retry_after) from e
 
+        checkout_started = time.perf_counter()
+        pooled = self.checkout(Config.BROKER_CHECKOUT_TIMEOUT)
         try:
-            if not connection.is_open:
-                connection = self.create_connection()
-            yield connection
-        except pika.exceptions.AMQPConnectionError:
-            connection = self.create_connection()
-            yield connection
-        finally:
-            with self.lock:
-                if len(self.connections) < self.max_connections:
-                    if connection.is_open:
-                        self.connections.append(connection)
-                    else:
-                        connection = self.create_connection()
-                        self.connections.append(connection)
-                else:
-                    connection.close()
+            if pooled is None or not pooled.is_open:
+                if pooled is not None:
+                    queue_connection_recreations.inc()
+                    pooled.close()
+                pooled = PooledConnection(self.create_connection())
+        except BROKER_ERRORS as e:
+            self.checked_in()
+            self.breaker.record_failure()
+            raise BrokerUnavailable(f"Broker connection failed: {str(e)}", self.breaker.retry_after()) from e
+        except BaseException:
+            self.checked_in()
+            raise
+        checkout_wait = time.perf_counter() - checkout_started
+        queue_checkout_wait.observe(checkout_wait)
+        record_phase('queue_checkout', checkout_wait)
 
-    def enqueue(self, request):
-        for _ in range(self.max_retries):
+        try:
+            yield pooled
+        except BROKER_ERRORS as e:
+            self.breaker.record_failure()
+            self.release(pooled)
+            raise BrokerUnavailable(f"Broker connection lost: {str(e)}", self.breaker.retry_after()) from e
+        except BaseException:
+            # The broker answered; the error is the caller's
+            self.breaker.record_success()
+            pooled.last_used = time.monotonic()
+            self.release(pooled)
+            raise
+        self.breaker.record_success()
+        pooled.last_used = time.monotonic()
+        self.release(pooled)
+
+    def checkout(self, timeout):
+        # Takes an idle connection, or a free slot (None) to open a new one in,
+        # waiting up to `timeout` seconds for either
+        deadline = time.monotonic() + timeout
+        with self.available:
+            while not self.connections and self.in_use >= self.max_connections:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    queue_checkout_timeouts.inc()
+                    raise PoolExhausted(f"No broker connection free within {timeout}s", 1)
+                self.available.wait(remaining)
+            self.in_use += 1
+            return self.connections.pop() if self.connections else None
+
+    def checked_in(self):
+        # Gives back a slot whose connection was never opened
+        with self.available:
+            self.in_use -= 1
+            self.available.notify()
+
+    def release(self, pooled):
+        if pooled.is_open and time.monotonic() - pooled.created_at >= Config.BROKER_MAX_LIFETIME:
+            queue_connections_evicted.inc('lifetime')
+            pooled.close()
+        keep = pooled.is_open
+        with self.available:
+            self.in_use -= 1
+            if keep:
+                self.connections.append(pooled)
+            self.available.notify()
+        if not keep:
+            pooled.close()
+
+    def run_maintenance(self):
+        while True:
+            time.sleep(Config.BROKER_MAINTENANCE_INTERVAL)
             try:
-                with self.get_connection() as connection:
-                    channel = connection.channel()
-                    channel.queue_declare(queue='request_queue', durable=True)
-                    channel.basic_publish(
-                        exchange='',
-                        routing_key='request_queue',
-                        body=json.dumps({'id': request.id, 'query': request.user_query}),
-                        properties=pika.BasicProperties(delivery_mode=2)
-                    )
-                return
-            except pika.exceptions.AMQPConnectionError:
-                time.sleep(self.retry_delay)
-        raise Exception("Failed to enqueue request after multiple attempts")
+                self.maintain()
+            except Exception as e:
+                logger.error(f"Broker pool maintenance failed: {str(e)}")
+
+    def maintain(self):
+        # Idle connections are checked out for the duration, so no request
+        # thread uses one while its heartbeats are being serviced
+        with self.available:
+            idle, self.connections = self.connections, []
+            self.in_use += len(idle)
+        now = time.monotonic()
+        for pooled in idle:
+            if now - pooled.last_used >= Config.BROKER_IDLE_TIMEOUT:
+                queue_connections_evicted.inc('idle')
+                pooled.close()
+            elif pooled.is_open:
+                try:
+                    # Answers the broker's heartbeats and sends ours
+                    pooled.connection.process_data_events(time_limit=0)
+                except pika.exceptions.AMQPError:
+                    pass
+                if not pooled.is_open:
+                    queue_connections_evicted.inc('dead')
+            self.release(pooled)
+
+    def pool_stats(self):
+        with self.lock:
+            return {'idle': len(self.connections), 'in_use': self.in_use, 'max': self.max_connections}
+
+    def enqueue(self, request):
+        with self.get_connection() as pooled, timed('queue_io'):
+            pooled.channel.basic_publish(
+                exchange='',
+                routing_key=REQUEST_QUEUE,
+                body=json.dumps({'id': request.id, 'query': request.user_query}),
+                properties=pika.BasicProperties(delivery_mode=2)
+            )
+
+    def enqueue_many(self, requests):
+        # Publish the whole batch inside a broker transaction so the messages
+        # are pipelined and confirmed by a single tx_commit round trip.
+        with self.get_connection() as pooled, timed('queue_io'):
+            channel = pooled.transactional_channel()
+            for request in requests:
+                channel.basic_publish(
+                    exchange='',
+                    routing_key=REQUEST_QUEUE,
+                    body=json.dumps({'id': request.id, 'query': request.user_query}),
+                    properties=pika.BasicProperties(delivery_mode=2)
+                )
+            channel.tx_commit()
+
+    def publish_events(self, exchange, events):
+        # Transient fanout notifications: a lost event only delays a stream
+        # subscriber until its next database check, so there is no retry loop.
+        with self.get_connection() as pooled, timed('queue_io'):
+            pooled.declare_exchange(exchange)
+            channel = pooled.transactional_channel()
+            for event in events:
+                channel.basic_publish(exchange=exchange, routing_key='', body=json.dumps(event))
+            channel.tx_commit()
+
+    def wait_for_message(self, channel, timeout):
+        # Short-lived consumer: returns as soon as a message is delivered, or
+        # (None, None, None) once `timeout` seconds pass without one. The message
+        # is left unacknowledged for the caller.
+        message = (None, None, None)
+        for message in channel.consume(queue=REQUEST_QUEUE, inactivity_timeout=timeout):
+            break
+        channel.cancel()
+        return message
 
-    def dequeue(self):
-        for _ in range(self.max_retries):
+    def dequeue(self, timeout=None):
+        with self.get_connection() as pooled, timed('queue_io'):
+            channel = pooled.channel
+            if timeout:
+                method_frame, header_frame, body = self.wait_for_message(channel, timeout)
+            else:
+                method_frame, header_frame, body = channel.basic_get(queue=REQUEST_QUEUE)
+            if method_frame:
+                channel.basic_ack(method_frame.delivery_tag)
+                data = json.loads(body)
+                return Request(id=data['id'], query=data['query'])
+        return None
+
+    @contextmanager
+    def fetch_batch(self, max_count, timeout=None):
+        # Yields up to `max_count` requests fetched on one channel. They are acked
+        # with a single multiple=True ack when the block exits cleanly, and
+        # requeued if it raises, so the caller can record them durably first.
+        with self.get_connection() as pooled:
+            channel = pooled.channel
+            requests = []
+            last_delivery_tag = None
             try:
-                with self.get_connection() as connection:
-                    channel = connection.channel()
-                    channel.queue_declare(queue='request_queue', durable=True)
-                    method_frame, header_frame, body = channel.basic_get(queue='request_queue')
-                    if method_frame:
-                        channel.basic_ack(method_frame.delivery_tag)
+                with timed('queue_io'):
+                    if timeout:
+                        method_frame, header_frame, body = self.wait_for_message(channel, timeout)
+                    else:
+                        method_frame, header_frame, body = channel.basic_get(queue=REQUEST_QUEUE)
+                    while method_frame:
+                        last_delivery_tag = method_frame.delivery_tag
                         data = json.loads(body)
-                        return Request(id=data['id'], query=data['query'])
-                return None
-            except pika.exceptions.AMQPConnectionError:
-                time.sleep(self.retry_delay)
-        raise Exception("Failed to dequeue request after multiple attempts")
+                        requests.append(Request(id=data['id'], query=data['query']))
+                        if len(requests) >= max_count:
+                            break
+                        method_frame, header_frame, body = channel.basic_get(queue=REQUEST_QUEUE)
+
+                yield requests
+            except Exception:
+                if last_delivery_tag is not None and channel.is_open:
+                    channel.basic_nack(last_delivery_tag, multiple=True, requeue=True)
+                raise
+            else:
+                if last_delivery_tag is not None:
+                    with timed('queue_io'):
+                        channel.basic_ack(last_delivery_tag, multiple=True)
+
+queue_service = QueueService()
+
+registry.callback(
+    'queue_pool_connections', 'Idle broker connections held in the pool', 'gauge',
+    lambda: {(): queue_service.pool_stats()['idle']}
+)
+
+registry.callback(
+    'queue_pool_in_use', 'Broker connections checked out of the pool', 'gauge',
+    lambda: {(): queue_service.pool_stats()['in_use']}
+)
 
-queue_service = QueueService()
\ No newline at end of file
+registry.callback(
+    'queue_circuit_open', 'Whether the broker circuit breaker is rejecting calls (1) or not (0)', 'gauge',
+    lambda: {(): int(queue_service.breaker.state == CircuitBreaker.OPEN)}
+)
@@ -5,7 +5,12 @@ from flask_dance.contrib.google import make_google_blueprint
 import requests
 import jwt
 from uuid import UUID
+from app import db
 from app.models.user import User
+from app.utils.cache import ExpiringLRUCache
+from app.utils.metrics import auth_failures, registry
+from app.utils.timing import timed
+from config import Config
 
 import jwt
 from typing import TypedDict, Optional
@@ -32,52 +37,102 @@ def decode_token(stored_token: str) -> Optional[DecodedToken]:
         print("Failed to decode token")
         return None
 
+# Maps session token -> detached User, so repeated calls with the same token skip
+# both the JWT decode and the user lookup. Entries never outlive the token's
+# `exp`, and AUTH_CACHE_TTL bounds how long a logout in another process can lag.
+principal_cache = ExpiringLRUCache(maxsize=Config.AUTH_CACHE_SIZE, ttl=Config.AUTH_CACHE_TTL)
+
+registry.callback(
+    'auth_cache_lookups_total', 'Session token lookups in the principal cache', 'counter',
+    lambda: {('hit',): principal_cache.hits, ('miss',): principal_cache.misses}, ('result',)
+)
+
+def invalidate_token(session_token: str) -> None:
+    principal_cache.pop(session_token)
+
+def invalidate_user(user_id: UUID) -> None:
+    principal_cache.remove_where(lambda user: user.id == user_id)
+
+class AuthFailure(Exception):
+    """A rejected Authorization header or session token.
+
+    ``reason`` is the auth_failures label and ``message`` the ``msg`` of the
+    401 response; the exception text is what gets logged.
+    """
+
+    def __init__(self, reason, message, log_message):
+        super().__init__(log_message)
+        self.reason = reason
+        self.message = message
+
+    @classmethod
+    def invalid_token(cls, error):
+        return cls('invalid_token', "Invalid session", f"Session token validation failed: {str(error)}")
+
+    def record(self, logger):
+        logger.error(str(self))
+        auth_failures.inc(self.reason)
+
+def bearer_token(auth_header):
+    """Return the session token of a ``Bearer`` Authorization header."""
+    if not auth_header:
+        raise AuthFailure('missing_header', "Missing Authorization header", "No Authorization header present")
+
+    parts = auth_header.split()
+    if parts[0].lower() != 'bearer':
+        raise AuthFailure('invalid_header', "Invalid Authorization header", "Authorization header must start with Bearer")
+    elif len(parts) == 1:
+        raise AuthFailure('invalid_header', "Token not found", "Token not found in Authorization header")
+    elif len(parts) > 2:
+        raise AuthFailure('invalid_header', "Invalid Authorization header", "Authorization header must be Bearer token")
+    return parts[1]
+
+def session_claims(session_token):
+    """Decode a session token the principal cache missed and check its expiry."""
+    try:
+        with timed('auth_decode'):
+            decoded_token = decode_token(session_token)
+        expired = decoded_token['exp'] < datetime.now().timestamp()
+    except Exception as e:
+        raise AuthFailure.invalid_token(e) from e
+    if expired:
+        raise AuthFailure('expired', "Session expired", "Session token has expired")
+    return decoded_token
+
+def cache_principal(session_token, user, decoded_token):
+    """Cache the (detached) user a session token resolved to, until the token expires."""
+    if not user:
+        raise AuthFailure('unknown_user', "Invalid session", "No user found for the given session token")
+    principal_cache.set(session_token, user, ttl=decoded_token['exp'] - datetime.now().timestamp())
+
 def oauth_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        auth_header = request.headers.get('Authorization')
-        
-        if not auth_header:
-            current_app.logger.error("No Authorization header present")
-            return jsonify({"msg": "Missing Authorization header"}), 401
-
-        parts = auth_header.split()
-        if parts[0].lower() != 'bearer':
-            current_app.logger.error("Authorization header must start with Bearer")
-            return jsonify({"msg": "Invalid Authorization header"}), 401
-        elif len(parts) == 1:
-            current_app.logger.error("Token not found in Authorization header")
-            return jsonify({"msg": "Token not found"}), 401
-        elif len(parts) > 2:
-            current_app.logger.error("Authorization header must be Bearer token")
-            return jsonify({"msg": "Invalid Authorization header"}), 401
-
-        session_token = parts[1]
-        
         try:
-            # Decode the session token
-            decoded_token = decode_token(session_token)
-            
-            # Check if the token has expired
-            if decoded_token['exp'] < datetime.now().timestamp():
-                current_app.logger.error("Session token has expired")
-                return jsonify({"msg": "Session expired"}), 401
-            
-            # Get the user from the database using the session token
-            
-            user = User.query.filter_by(id=UUID(decoded_token['id'])).first()
-            
+            session_token = bearer_token(request.headers.get('Authorization'))
+            user = principal_cache.get(session_token)
             if not user:
-                current_app.logger.error("No user found for the given session token")
-                return jsonify({"msg": "Invalid session"}), 401
-            
-            # Attach the user to the request for use in the route handler
-            request.current_user = user
-            
-            return f(*args, **kwargs)
+                decoded_token = session_claims(session_token)
+                try:
+                    # Get the user from the database using the session token
+                    with timed('auth_lookup'):
+                        user = User.query.filter_by(id=UUID(decoded_token['id'])).first()
+                    if user:
+                        # Detach the user so it can be shared across requests
+                        # without being expired by the handler's commit
+                        db.session.expunge(user)
+                except Exception as e:
+                    raise AuthFailure.invalid_token(e) from e
+                cache_principal(session_token, user, decoded_token)
+        except AuthFailure as e:
+            e.record(current_app.logger)
+            return jsonify({"msg": e.message}), 401
+
+        # Attach the user to the request for use in the route handler. The
+        # handler runs outside the try block so its own errors (such as a 503
+        # for an unavailable broker) are not reported as an invalid session.
+        request.current_user = user
         
-        except Exception as e:
-            current_app.logger.error(f"Session token validation failed: {str(e)}")
-            return jsonify({"msg": "Invalid session"}), 401
+        return f(*args, **kwargs)
 
     return decorated
\ No newline at end of file
@@ -0,0 +1,60 @@
+import time
+from threading import Lock
+
+from cachetools import TLRUCache
+
+
+class ExpiringLRUCache:
+    """Thread-safe, size-bounded LRU cache whose entries each carry their own TTL.
+
+    Entries are evicted least-recently-used first once ``maxsize`` is reached,
+    and are never served past ``min(ttl, self.ttl)`` seconds after being set.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.ttl = ttl
+        self.entries = TLRUCache(maxsize=maxsize, ttu=lambda key, entry, now: entry[0])
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+
+    def pop(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+        return entry[1] if entry else None
+
+    def remove_where(self, predicate):
+        with self.lock:
+            keys = [key for key, entry in self.entries.items() if predicate(entry[1])]
+            for key in keys:
+                del self.entries[key]
+        return len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.entries),
+                'maxsize': self.entries.maxsize
+            }
@@ -0,0 +1,55 @@
+import time
+from threading import Lock
+
+
+class CircuitOpen(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Circuit open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Fails calls fast after repeated failures instead of letting each one time out.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    before_call() raises CircuitOpen for ``reset_timeout`` seconds. Then a
+    single trial call is let through (half-open): its success closes the
+    circuit, its failure opens it for another ``reset_timeout``.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=10):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.lock = Lock()
+
+    def retry_after(self):
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def before_call(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return
+            if self.retry_after() == 0:
+                # Let one trial call through; if it never reports back, another
+                # is let through after reset_timeout
+                self.state = self.HALF_OPEN
+                self.opened_at = time.monotonic()
+                return
+            raise CircuitOpen(self.retry_after())
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
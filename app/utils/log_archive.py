@@ -0,0 +1,146 @@
+import hashlib
+import os
+import tarfile
+import tempfile
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstd downloads are optional
+    zstandard = None
+
+
+CHUNK_SIZE = 64 * 1024
+# Streams spooled for a Range request stay in memory up to this size, then
+# move to a temporary file
+SPOOL_MEMORY = 8 * 1024 * 1024
+
+COMPRESSIONS = {
+    'none': {'extension': '', 'mimetype': 'application/octet-stream'},
+    'gzip': {'extension': '.gz', 'mimetype': 'application/gzip'},
+    'zstd': {'extension': '.zst', 'mimetype': 'application/zstd'},
+}
+
+
+class LogFile:
+    """A log file pinned to the size it had when the download started."""
+
+    def __init__(self, path):
+        stat = os.stat(path)
+        self.path = path
+        self.name = os.path.basename(path)
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime_ns
+
+
+def compression_available(compress):
+    return compress in COMPRESSIONS and (compress != 'zstd' or zstandard is not None)
+
+
+def representation_etag(files, compress):
+    # Identifies the exact byte stream: the same pinned files and encoding
+    # always produce the same bytes, which is what makes Range resumable
+    digest = hashlib.sha1(compress.encode())
+    for log_file in files:
+        digest.update(f'{log_file.name}:{log_file.size}:{log_file.mtime}'.encode())
+    return digest.hexdigest()
+
+
+def read_pinned(log_file):
+    remaining = log_file.size
+    with open(log_file.path, 'rb') as handle:
+        while remaining > 0:
+            chunk = handle.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    if remaining > 0:
+        # Truncated after pinning; pad so sizes declared in tar headers hold
+        yield b'\0' * remaining
+
+
+def tar_stream(files):
+    # Writes ustar/pax headers by hand so file contents stream straight
+    # through instead of being buffered by tarfile.addfile
+    written = 0
+    for log_file in files:
+        info = tarfile.TarInfo(log_file.name)
+        info.size = log_file.size
+        info.mtime = log_file.mtime // 1_000_000_000
+        info.mode = 0o644
+        header = info.tobuf(format=tarfile.PAX_FORMAT)
+        written += len(header)
+        yield header
+        for chunk in read_pinned(log_file):
+            written += len(chunk)
+            yield chunk
+        padding = -log_file.size % tarfile.BLOCKSIZE
+        written += padding
+        yield b'\0' * padding
+    end_of_archive = 2 * tarfile.BLOCKSIZE
+    written += end_of_archive
+    yield b'\0' * (end_of_archive + -written % tarfile.RECORDSIZE)
+
+
+def compress_stream(chunks, compress):
+    if compress == 'none':
+        yield from chunks
+        return
+    if compress == 'gzip':
+        # wbits=31 writes a gzip header with mtime 0, keeping output deterministic
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        finish = compressor.flush
+    else:
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        finish = compressor.flush
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield finish()
+
+
+def log_stream(files, compress):
+    chunks = tar_stream(files) if len(files) > 1 else read_pinned(files[0])
+    return compress_stream(chunks, compress)
+
+
+def spool_stream(chunks):
+    """Write a stream to a temporary file and return (file, length).
+
+    A Range request needs the length of a compressed stream before it sends
+    a byte; spooling measures it and keeps the bytes for the slice, so the
+    selection is compressed once rather than once to measure and once to send.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY)
+    for chunk in chunks:
+        spool.write(chunk)
+    return spool, spool.tell()
+
+
+def read_spooled(spool, start, stop):
+    """Yield bytes [start, stop) of a spooled stream, then close it."""
+    try:
+        spool.seek(start)
+        remaining = stop - start
+        while remaining > 0:
+            chunk = spool.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        spool.close()
+
+
+def slice_stream(chunks, start, stop):
+    """Yield bytes [start, stop) of a chunked stream."""
+    position = 0
+    for chunk in chunks:
+        end = position + len(chunk)
+        if end > start:
+            yield chunk[max(start - position, 0):stop - position]
+        position = end
+        if position >= stop:
+            break
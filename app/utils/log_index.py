@@ -0,0 +1,209 @@
+import bisect
+import glob
+import json
+import os
+from datetime import datetime
+from threading import Lock
+
+from app.utils.log_reader import read_lines_reversed
+from config import Config
+
+
+TIMESTAMP_PREFIX = b'{"timestamp": "'
+TIMESTAMP_LENGTH = len('2024-01-01 00:00:00,000')
+
+
+def line_timestamp(line):
+    # RequestFormatter always writes the timestamp first, so the common case
+    # avoids decoding the whole JSON line
+    if line.startswith(TIMESTAMP_PREFIX):
+        start = len(TIMESTAMP_PREFIX)
+        return line[start:start + TIMESTAMP_LENGTH].decode('ascii', errors='replace')
+    try:
+        return json.loads(line).get('timestamp')
+    except (ValueError, AttributeError):
+        return None
+
+
+def to_log_timestamp(value):
+    """Convert an ISO 8601 string to the comparable format the log files use.
+
+    Log timestamps are written in server local time, so aware values are
+    converted to local time first.
+    """
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment.strftime('%Y-%m-%d %H:%M:%S,') + f'{moment.microsecond // 1000:03d}'
+
+
+class LogIndex:
+    """Sparse timestamp -> byte offset index over one append-only log file.
+
+    One entry is recorded roughly every ``interval`` bytes. Refreshing only
+    reads the bytes appended since the previous refresh, and because the
+    index follows the file's inode it stays valid when the file is rotated.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        self.timestamps = []
+        self.offsets = []
+        self.indexed_to = 0
+        self.last_timestamp = None
+
+    @property
+    def first_timestamp(self):
+        return self.timestamps[0] if self.timestamps else None
+
+    def refresh(self, path):
+        with self.lock:
+            size = os.path.getsize(path)
+            if size < self.indexed_to:
+                # Truncated in place: start over
+                self.reset()
+            if size == self.indexed_to:
+                return
+
+            next_mark = self.offsets[-1] + self.interval if self.offsets else 0
+            offset = self.indexed_to
+            last_line = None
+            with open(path, 'rb') as log_file:
+                log_file.seek(offset)
+                for line in log_file:
+                    if not line.endswith(b'\n'):
+                        # A line still being written; index it on the next refresh
+                        break
+                    if offset >= next_mark:
+                        timestamp = line_timestamp(line)
+                        if timestamp:
+                            self.timestamps.append(timestamp)
+                            self.offsets.append(offset)
+                            next_mark = offset + self.interval
+                    offset += len(line)
+                    last_line = line
+
+            self.indexed_to = offset
+            if last_line:
+                self.last_timestamp = line_timestamp(last_line) or self.last_timestamp
+
+    def overlaps(self, since, until):
+        if not self.timestamps:
+            return True
+        if since and self.last_timestamp and self.last_timestamp < since:
+            return False
+        if until and self.first_timestamp >= until:
+            return False
+        return True
+
+    def offset_before(self, timestamp):
+        # Start an extra entry early so lines written slightly out of order
+        # around an index mark are not missed
+        position = bisect.bisect_left(self.timestamps, timestamp) - 2
+        return self.offsets[position] if position >= 0 else 0
+
+    def offset_after(self, timestamp):
+        position = bisect.bisect_right(self.timestamps, timestamp) + 1
+        return self.offsets[position] if position < len(self.offsets) else None
+
+
+class LogSearch:
+    """Searches the current and rotated files of one log type, oldest to newest."""
+
+    def __init__(self, interval=256 * 1024):
+        self.interval = interval
+        self.indexes = {}
+        self.lock = Lock()
+
+    def log_files(self, log_dir, log_type):
+        current = os.path.join(log_dir, f'{log_type}.log')
+        # TimedRotatingFileHandler suffixes sort chronologically (YYYY-MM-DD)
+        files = sorted(glob.glob(f'{glob.escape(current)}.*'))
+        if os.path.exists(current):
+            files.append(current)
+        return files
+
+    def index_for(self, path):
+        stat = os.stat(path)
+        key = (stat.st_dev, stat.st_ino)
+        with self.lock:
+            index = self.indexes.get(key)
+            if index is None:
+                index = self.indexes[key] = LogIndex(self.interval)
+        index.refresh(path)
+        return key, index
+
+    def prune(self, live_keys):
+        with self.lock:
+            for key in set(self.indexes) - live_keys:
+                del self.indexes[key]
+
+    def search(self, log_dir, log_type, limit, since=None, until=None, matches=None):
+        """Return up to ``limit`` matching entries in chronological order, plus a malformed-line count.
+
+        With ``since`` the first ``limit`` matches at or after it are returned;
+        otherwise the last ``limit`` matches before ``until`` (or the end).
+        """
+        files = []
+        for path in self.log_files(log_dir, log_type):
+            try:
+                files.append((path, self.index_for(path)))
+            except FileNotFoundError:
+                # Rotated away or deleted between listing and indexing
+                continue
+        self.prune({key for _, (key, _) in files})
+        files = [(path, index) for path, (_, index) in files if index.overlaps(since, until)]
+
+        found = []
+        skipped = 0
+        if since:
+            for path, index in files:
+                with open(path, 'rb') as log_file:
+                    log_file.seek(index.offset_before(since))
+                    for line in log_file:
+                        entry = self.parse(line)
+                        if entry is None:
+                            skipped += 1
+                            continue
+                        timestamp = entry.get('timestamp', '')
+                        if timestamp < since:
+                            continue
+                        if until and timestamp >= until:
+                            return found, skipped
+                        if matches is None or matches(entry):
+                            found.append(entry)
+                            if len(found) >= limit:
+                                return found, skipped
+            return found, skipped
+
+        for path, index in reversed(files):
+            end = index.offset_after(until) if until else None
+            for line in read_lines_reversed(path, end=end):
+                entry = self.parse(line)
+                if entry is None:
+                    skipped += 1
+                    continue
+                if until and entry.get('timestamp', '') >= until:
+                    continue
+                if matches is None or matches(entry):
+                    found.append(entry)
+                    if len(found) >= limit:
+                        found.reverse()
+                        return found, skipped
+        found.reverse()
+        return found, skipped
+
+    @staticmethod
+    def parse(line):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        return entry if isinstance(entry, dict) else None
+
+
+log_search = LogSearch(interval=Config.LOG_INDEX_INTERVAL)
@@ -0,0 +1,26 @@
+import os
+
+
+def read_lines_reversed(path, end=None, block_size=64 * 1024):
+    """Yield the lines of ``path`` last line first.
+
+    The file is read backwards from ``end`` (default: end of file) in
+    ``block_size`` chunks, so the cost depends on how many lines the caller
+    consumes rather than on the size of the file. Empty lines are skipped and
+    undecodable bytes are replaced.
+    """
+    with open(path, 'rb') as log_file:
+        position = log_file.seek(0, os.SEEK_END) if end is None else end
+        remainder = b''
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            log_file.seek(position)
+            lines = (log_file.read(read_size) + remainder).split(b'\n')
+            # The first piece may be the tail of a line that starts in an earlier block
+            remainder = lines[0]
+            for line in reversed(lines[1:]):
+                if line:
+                    yield line.decode('utf-8', errors='replace')
+        if remainder:
+            yield remainder.decode('utf-8', errors='replace')
@@ -0,0 +1,323 @@
+import bisect
+import glob
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from threading import Lock, Thread, current_thread, local
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric(ABC):
+    """Base class for metrics whose hot-path writes never take a lock.
+
+    Each thread writes to its own shard (a dict keyed by label values), which
+    only that thread ever mutates; collect() merges the shards at scrape time.
+    Shards of threads that have exited are folded into ``retired`` and
+    dropped, so short-lived threads do not grow the shard list.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.local = local()
+        self.shards = []  # (thread, values) pairs
+        self.retired = {}
+        self.lock = Lock()
+
+    def shard(self):
+        values = getattr(self.local, 'values', None)
+        if values is None:
+            values = self.local.values = {}
+            with self.lock:
+                self.retire_dead_shards()
+                self.shards.append((current_thread(), values))
+        return values
+
+    def retire_dead_shards(self):
+        # Called with the lock held. A dead thread can no longer write to its
+        # shard, so it is safe to read it outside that thread.
+        live = []
+        for thread, values in self.shards:
+            if thread.is_alive():
+                live.append((thread, values))
+            else:
+                self.merge(self.retired, values)
+        self.shards = live
+
+    @abstractmethod
+    def merge(self, totals, values):
+        """Add the label values in ``values`` into ``totals``."""
+
+    def reset(self):
+        with self.lock:
+            self.local = local()
+            self.shards = []
+            self.retired = {}
+
+    def snapshots(self):
+        with self.lock:
+            self.retire_dead_shards()
+            shards = [values for thread, values in self.shards]
+            retired = dict(self.retired)
+        return [retired] + [dict(shard) for shard in shards]
+
+    def collect(self):
+        totals = {}
+        for shard in self.snapshots():
+            self.merge(totals, shard)
+        return totals
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        values = self.shard()
+        values[labels] = values.get(labels, 0) + amount
+
+    def merge(self, totals, values):
+        for labels, value in values.items():
+            totals[labels] = totals.get(labels, 0) + value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        values = self.shard()
+        # Layout: one count per bucket plus +Inf, then sum, then count
+        counts = values.get(labels)
+        if counts is None:
+            counts = values[labels] = [0] * (len(self.buckets) + 3)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def merge(self, totals, values):
+        for labels, counts in values.items():
+            merged = totals.get(labels, [0] * len(counts))
+            # A new list rather than adding in place: collect() reads the
+            # retired totals outside the lock
+            totals[labels] = [total + count for total, count in zip(merged, list(counts))]
+
+
+class CallbackMetric:
+    """A gauge or counter whose values are read from its owner at scrape time."""
+
+    def __init__(self, name, documentation, kind, callback, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+
+    def reset(self):
+        pass
+
+    def collect(self):
+        try:
+            return {tuple(labels): value for labels, value in self.callback().items()}
+        except Exception:
+            return {}
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them in Prometheus text exposition format.
+
+    When ``directory`` is set (one directory shared by all gunicorn workers),
+    each process periodically writes its own snapshot there and render()
+    merges the snapshots of all processes. Counters and histograms from
+    exited workers are kept so totals stay monotonic; gauges only come from
+    live ones.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = Lock()
+        self.directory = None
+        self.flush_interval = 5
+        self.pid = None
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, kind, callback, labelnames=()):
+        return self.register(CallbackMetric(name, documentation, kind, callback, labelnames))
+
+    def configure(self, directory=None, flush_interval=5):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def ensure_process(self):
+        # Called on every request: after a fork, drop values inherited from the
+        # parent and start this process's snapshot writer
+        pid = os.getpid()
+        if pid == self.pid:
+            return
+        with self.lock:
+            if pid == self.pid:
+                return
+            for metric in self.metrics.values():
+                metric.reset()
+            self.pid = pid
+            if self.directory:
+                Thread(target=self.run_flusher, name='metrics-flusher', daemon=True).start()
+
+    def collect(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {
+            metric.name: {
+                'kind': metric.kind,
+                'values': [[list(labels), value] for labels, value in metric.collect().items()]
+            }
+            for metric in metrics
+        }
+
+    def snapshot_path(self, pid):
+        return os.path.join(self.directory, f'metrics-{pid}.json')
+
+    def flush(self):
+        path = self.snapshot_path(os.getpid())
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as snapshot:
+            json.dump(self.collect(), snapshot)
+        os.replace(temporary, path)
+
+    def run_flusher(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def merged(self):
+        own = self.collect()
+        if not self.directory:
+            return own
+
+        merged = {name: {'kind': data['kind'], 'values': {}} for name, data in own.items()}
+        snapshots = [own]
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            pid = int(os.path.basename(path)[len('metrics-'):-len('.json')])
+            if pid == os.getpid():
+                continue
+            try:
+                with open(path) as snapshot:
+                    data = json.load(snapshot)
+            except (OSError, ValueError):
+                continue
+            if not process_alive(pid):
+                data = {name: values for name, values in data.items() if values['kind'] != 'gauge'}
+            snapshots.append(data)
+
+        for snapshot in snapshots:
+            for name, data in snapshot.items():
+                target = merged.setdefault(name, {'kind': data['kind'], 'values': {}})['values']
+                for labels, value in data['values']:
+                    labels = tuple(labels)
+                    if isinstance(value, list):
+                        current = target.setdefault(labels, [0] * len(value))
+                        for position, count in enumerate(value):
+                            current[position] += count
+                    else:
+                        target[labels] = target.get(labels, 0) + value
+        return {
+            name: {'kind': data['kind'], 'values': list(data['values'].items())}
+            for name, data in merged.items()
+        }
+
+    def render(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+        lines = []
+        for name, data in sorted(self.merged().items()):
+            metric = metrics.get(name)
+            if metric is None:
+                continue
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {data["kind"]}')
+            for labels, value in sorted(data['values'], key=lambda item: tuple(map(str, item[0]))):
+                pairs = list(zip(metric.labelnames, labels))
+                if data['kind'] == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets + (float('inf'),), value):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f'{name}_bucket{format_labels(pairs + [("le", le)])} {cumulative}')
+                    lines.append(f'{name}_sum{format_labels(pairs)} {value[-2]}')
+                    lines.append(f'{name}_count{format_labels(pairs)} {value[-1]}')
+                else:
+                    lines.append(f'{name}{format_labels(pairs)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label_value(value)}"' for key, value in pairs) + '}'
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    'http_requests_total', 'HTTP requests handled', ('blueprint', 'route', 'method', 'status'))
+http_request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Time spent handling HTTP requests', ('blueprint', 'route'))
+db_query_duration = registry.histogram(
+    'db_query_duration_seconds', 'Time spent executing SQL statements')
+queue_checkout_wait = registry.histogram(
+    'queue_checkout_wait_seconds', 'Time spent checking a broker connection out of the pool')
+queue_connection_recreations = registry.counter(
+    'queue_connection_recreations_total', 'Broker connections replaced because they were closed or failed')
+queue_channels_opened = registry.counter(
+    'queue_channels_opened_total', 'Broker channels opened; pooled channels are long-lived')
+queue_topology_declarations = registry.counter(
+    'queue_topology_declarations_total', 'Queue topology declarations, one per new broker connection')
+queue_checkout_timeouts = registry.counter(
+    'queue_checkout_timeouts_total', 'Broker connection checkouts that timed out with the pool exhausted')
+queue_connections_evicted = registry.counter(
+    'queue_connections_evicted_total', 'Pooled broker connections closed by the pool', ('reason',))
+queue_circuit_rejections = registry.counter(
+    'queue_circuit_rejections_total', 'Broker operations rejected without trying because the circuit was open')
+auth_failures = registry.counter(
+    'auth_failures_total', 'Requests rejected by oauth_required', ('reason',))
+outbox_published = registry.counter(
+    'outbox_published_total', 'Requests published to the broker by the outbox relay')
+outbox_publish_lag = registry.histogram(
+    'outbox_publish_lag_seconds', 'Age of the oldest outbox message in each batch the relay publishes')
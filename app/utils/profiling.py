@@ -0,0 +1,160 @@
+import cProfile
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from threading import Event, Lock, Thread, get_ident
+
+from flask import g, request
+
+# cProfile hooks into process-wide state (sys.monitoring on Python 3.12+), so
+# only one request at a time can run under it; enabling a second raises
+# ValueError("Another profiling tool is already active")
+cprofile_lock = Lock()
+
+
+class StackSampler:
+    """Samples the stacks of watched threads from a background thread.
+
+    The sampler only wakes up while at least one request is being watched,
+    and each watched request gets a Counter of collapsed stacks
+    ("module:function;module:function ..."), the input format of
+    flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.watched = {}
+        self.lock = Lock()
+        self.active = Event()
+        self.thread = None
+
+    def start(self, thread_id):
+        samples = Counter()
+        with self.lock:
+            self.watched[thread_id] = samples
+            self.active.set()
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = Thread(target=self.run, name='profile-sampler', daemon=True)
+                self.thread.start()
+        return samples
+
+    def stop(self, thread_id):
+        with self.lock:
+            samples = self.watched.pop(thread_id, Counter())
+            if not self.watched:
+                self.active.clear()
+        return samples
+
+    def run(self):
+        while True:
+            self.active.wait()
+            time.sleep(self.interval)
+            with self.lock:
+                watched = dict(self.watched)
+            frames = sys._current_frames()
+            for thread_id, samples in watched.items():
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                    frame = frame.f_back
+                if stack:
+                    samples[';'.join(reversed(stack))] += 1
+
+
+class ProfileStore:
+    """Writes profiles to a directory, keeping only the newest ``max_files``."""
+
+    def __init__(self, directory, max_files):
+        self.directory = directory
+        self.max_files = max_files
+        self.lock = Lock()
+
+    def list(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                entries.append({'name': name, 'size': stat.st_size, 'created_at': stat.st_mtime})
+        return sorted(entries, key=lambda entry: entry['created_at'], reverse=True)
+
+    def path_for(self, method, route, elapsed, extension):
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', route).strip('-') or 'root'
+        stamp = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+        return os.path.join(self.directory, f'{stamp}-{method}-{slug}-{elapsed * 1000:.0f}ms.{extension}')
+
+    def rotate(self):
+        with self.lock:
+            for entry in self.list()[self.max_files:]:
+                try:
+                    os.remove(os.path.join(self.directory, entry['name']))
+                except FileNotFoundError:
+                    pass
+
+
+def setup_profiling(app):
+    """Profile a sample of requests, or only slow ones, when PROFILING_ENABLED is set.
+
+    Nothing is registered when profiling is disabled, so it costs nothing.
+    """
+    if not app.config['PROFILING_ENABLED']:
+        return
+
+    sample_rate = app.config['PROFILE_SAMPLE_RATE']
+    slow_threshold = app.config['PROFILE_SLOW_THRESHOLD_MS'] / 1000
+    store = ProfileStore(app.config['PROFILE_DIR'], app.config['PROFILE_MAX_FILES'])
+    os.makedirs(store.directory, exist_ok=True)
+    sampler = StackSampler(app.config['PROFILE_SAMPLER_INTERVAL_MS'] / 1000) if slow_threshold > 0 else None
+
+    def start_cprofile():
+        # Returns an enabled profiler, or None if another request holds cProfile
+        if not cprofile_lock.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Some other profiling tool is active in this process
+            cprofile_lock.release()
+            return None
+        return profiler
+
+    @app.before_request
+    def start_profiling():
+        g.profile_started = time.perf_counter()
+        profiler = start_cprofile() if sample_rate > 0 and random.random() < sample_rate else None
+        if profiler:
+            g.profiler = profiler
+        elif sampler:
+            # Not sampled, or sampled while another request is under cProfile
+            g.profile_samples = sampler.start(get_ident())
+
+    @app.teardown_request
+    def finish_profiling(exception=None):
+        started = g.pop('profile_started', None)
+        profiler = g.pop('profiler', None)
+        samples = sampler.stop(get_ident()) if sampler and g.pop('profile_samples', None) is not None else None
+        if profiler:
+            profiler.disable()
+            cprofile_lock.release()
+        if started is None:
+            return
+
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else request.path
+        if profiler:
+            profiler.dump_stats(store.path_for(request.method, route, elapsed, 'prof'))
+        elif samples and elapsed >= slow_threshold:
+            with open(store.path_for(request.method, route, elapsed, 'folded'), 'w') as folded:
+                for stack, count in samples.most_common():
+                    folded.write(f'{stack} {count}\n')
+        else:
+            return
+        store.rotate()
@@ -0,0 +1,133 @@
+import json
+import time
+
+# Statuses after which a request's result no longer changes
+TERMINAL_STATUSES = ('completed', 'not_found')
+KEEP_ALIVE = ": keep-alive\n\n"
+
+
+class InvalidBatch(ValueError):
+    """A request body or query string that is answered with a 400 and this message."""
+
+
+def batch_queries(data, max_batch_size):
+    """Return the queries of a /submit-requests body."""
+    queries = data.get('queries') if isinstance(data, dict) else None
+    if not isinstance(queries, list) or not queries:
+        raise InvalidBatch('queries must be a non-empty array')
+    if len(queries) > max_batch_size:
+        raise InvalidBatch(f'A batch may contain at most {max_batch_size} queries')
+    if not all(isinstance(query, str) for query in queries):
+        raise InvalidBatch('Every query must be a string')
+    return queries
+
+
+def batch_results(data, max_batch_size):
+    """Return the items of a /submit-results body."""
+    items = data.get('results') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise InvalidBatch('results must be a non-empty array')
+    if len(items) > max_batch_size:
+        raise InvalidBatch(f'A batch may contain at most {max_batch_size} results')
+    # type() rather than isinstance(): bool is an int, and true would mean request 1
+    if not all(isinstance(item, dict) and type(item.get('request_id')) is int
+               and isinstance(item.get('result'), str) for item in items):
+        raise InvalidBatch('Every result must have an integer request_id and a string result')
+    return items
+
+
+def completable_results(items, leases):
+    """Map request ID -> (result, lease_id) for the items complete_requests_statement should try.
+
+    ``leases`` maps each existing request ID to its current lease; items for
+    missing requests or naming another lease are left out.
+    """
+    return {
+        item['request_id']: (item['result'], item.get('lease_id'))
+        for item in items
+        if item['request_id'] in leases and not (item.get('lease_id') and item['lease_id'] != leases[item['request_id']])
+    }
+
+
+def completed_events(results, completed):
+    return [
+        {'request_id': request_id, 'status': 'completed', 'result': results[request_id][0]}
+        for request_id in completed
+    ]
+
+
+def batch_outcomes(items, leases, completed):
+    return [
+        {'request_id': item['request_id'],
+         'status': 'not_found' if item['request_id'] not in leases
+         else 'completed' if item['request_id'] in completed else 'lease_expired'}
+        for item in items
+    ]
+
+
+def result_entry(req):
+    """Return the /get-result payload and ETag of a request, as kept in the result cache."""
+    return {
+        'payload': {'result': req.result, 'status': req.status, 'request_id': req.id},
+        'etag': f"{req.id}-{req.status}-{req.updated_at.isoformat()}"
+    }
+
+
+def result_events(request_ids, found):
+    """Return one result event per ID, given the requests ``found`` by ID."""
+    events = []
+    for request_id in request_ids:
+        req = found.get(request_id)
+        if req:
+            events.append({'request_id': request_id, 'status': req.status, 'result': req.result})
+        else:
+            events.append({'request_id': request_id, 'status': 'not_found'})
+    return events
+
+
+def stream_request_ids(ids, max_ids):
+    """Return the distinct request IDs of the /stream-results ``ids`` argument."""
+    try:
+        request_ids = list(dict.fromkeys(int(i) for i in ids.split(',') if i.strip()))
+    except ValueError:
+        raise InvalidBatch('ids must be comma-separated integers')
+    if not request_ids:
+        raise InvalidBatch('At least one request ID is required')
+    if len(request_ids) > max_ids:
+        raise InvalidBatch(f"At most {max_ids} request IDs may be streamed")
+    return request_ids
+
+
+def format_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+class ResultStream:
+    """The requests a /stream-results stream still waits for, and its deadline.
+
+    The WSGI and ASGI generators only differ in how they wait for the next
+    event; both write what these methods return.
+    """
+
+    def __init__(self, request_ids, timeout):
+        self.pending = set(request_ids)
+        self.deadline = time.monotonic() + timeout
+
+    def remaining(self):
+        """Seconds left to wait, or 0 once every request is done or time is up."""
+        return max(self.deadline - time.monotonic(), 0) if self.pending else 0
+
+    def result(self, event):
+        if event['status'] in TERMINAL_STATUSES:
+            self.pending.discard(event['request_id'])
+        return format_event('result', event)
+
+    def recheck(self, events):
+        # Safety net for notifications lost in transit: ``events`` are the
+        # current states of the pending requests
+        return ''.join(
+            self.result(event) for event in events if event['status'] in TERMINAL_STATUSES
+        ) + KEEP_ALIVE
+
+    def end(self):
+        return format_event('end', {'pending': sorted(self.pending)})
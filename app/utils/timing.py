@@ -0,0 +1,88 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from flask import g, has_app_context, has_request_context
+from flask.json.provider import DefaultJSONProvider
+
+
+# Server-Timing metric names, in the order they appear in the header
+PHASES = ('auth_decode', 'auth_lookup', 'db', 'queue_checkout', 'queue_io', 'serialize')
+
+
+def record_phase(name, seconds):
+    """Add ``seconds`` to phase ``name`` of the current request's timing breakdown.
+
+    A no-op outside a request that is being timed (background threads, or
+    when SERVER_TIMING_ENABLED is off).
+    """
+    if not has_app_context():
+        return
+    phases = g.get('server_timing')
+    # Time spent inside a timed() phase belongs to that phase alone
+    if phases is not None and not g.get('server_timing_depth'):
+        total = phases.get(name)
+        phases[name] = (total[0] + seconds, total[1] + 1) if total else (seconds, 1)
+
+
+@contextmanager
+def timed(name):
+    """Record the time spent in the block as phase ``name``.
+
+    Phases recorded inside the block (such as the ``db`` time of the query a
+    user lookup runs) are left out, so no time is counted twice.
+    """
+    depth = g.get('server_timing_depth', 0) if has_app_context() else None
+    if depth is not None:
+        g.server_timing_depth = depth + 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if depth is not None:
+            g.server_timing_depth = depth
+        record_phase(name, elapsed)
+
+
+def timing_breakdown(phases, total):
+    """Return the phases (plus ``total``) as {name: {'ms': ..., 'count': ...}}."""
+    breakdown = {
+        name: {'ms': round(phases[name][0] * 1000, 3), 'count': phases[name][1]}
+        for name in PHASES if name in phases
+    }
+    breakdown['total'] = {'ms': round(total * 1000, 3), 'count': 1}
+    return breakdown
+
+
+def current_breakdown():
+    """Return the breakdown of the request being timed so far, or None."""
+    phases = g.get('server_timing') if has_request_context() else None
+    if phases is None:
+        return None
+    return timing_breakdown(phases, time.perf_counter() - g.server_timing_started)
+
+
+class TimingFilter(logging.Filter):
+    """Adds the breakdown so far as ``timing`` to the lines a request logs."""
+
+    def filter(self, record):
+        breakdown = current_breakdown()
+        if breakdown is not None:
+            record.timing = breakdown
+        return True
+
+
+def server_timing_header(breakdown):
+    return ', '.join(
+        f'{name};dur={phase["ms"]}' + (f';desc="{phase["count"]}x"' if phase['count'] > 1 else '')
+        for name, phase in breakdown.items()
+    )
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Records the time jsonify() spends serializing as the ``serialize`` phase."""
+
+    def dumps(self, obj, **kwargs):
+        with timed('serialize'):
+            return super().dumps(obj, **kwargs)
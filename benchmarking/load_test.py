@@ -1,186 +1,335 @@
-import requests
-import random
-
+import argparse
+import json
+import os
+import sys
+import threading
 import time
-import concurrent.futures
-import statistics
-import random
+
+import requests
 from colorama import init, Fore, Style
-from tqdm import tqdm
+
+from stats import EndpointStats, RequestPool, pick_endpoint
 
 # Initialize colorama
 init(autoreset=True)
 
-# API base URL
-BASE_URL = "http://localhost:8080"  # Adjust this to your API's URL
-
-# Test parameters
-MAX_CONCURRENT = 50  # Maximum number of concurrent requests
-
-# Endpoints to test
-ENDPOINTS = [
-    ("/submit-request", "POST", {"query": "Test query"}),
-    ("/fetch-requests", "GET", None),
-    ("/submit-result", "POST", {"request_id": 1, "result": "Test result"}),
-    ("/get-result/1", "GET", None)
-]
-
-def get_session_token():
-    # You can return the session token retrieved from the auth flow of github or google
-    return "session_token"
-
-def make_request(endpoint, method, data):
-    url = f"{BASE_URL}{endpoint}"
-    headers = {"Authorization": f"Bearer {get_session_token()}"}
-    
-    start_time = time.time()
-    if method == "GET":
-        response = requests.get(url, headers=headers)
-    elif method == "POST":
-        response = requests.post(url, json=data, headers=headers)
-    
-    end_time = time.time()
-    return response.status_code, end_time - start_time
-
-def test_endpoint(endpoint, method, data, duration):
-    start_time = time.time()
-    request_count = 0
-    success_count = 0
-    response_times = []
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONCURRENT) as executor:
-        future_to_request = {}
-        with tqdm(total=duration, desc=f"{method} {endpoint}", unit="s", bar_format="{l_bar}{bar}| {n:.1f}/{total:.1f}s") as pbar:
-            while time.time() - start_time < duration:
-                # Submit new requests
-                while len(future_to_request) < MAX_CONCURRENT:
-                    future = executor.submit(make_request, endpoint, method, data)
-                    future_to_request[future] = time.time()
-                
-                # Check for completed requests
-                done, _ = concurrent.futures.wait(future_to_request, timeout=0.1, return_when=concurrent.futures.FIRST_COMPLETED)
-                
-                for future in done:
-                    status_code, response_time = future.result()
-                    request_count += 1
-                    response_times.append(response_time)
-                    if 200 <= status_code < 300:
-                        success_count += 1
-                    del future_to_request[future]
-
-                pbar.update(time.time() - start_time - pbar.n)
-
-            # Wait for any remaining requests to complete
-            for future in concurrent.futures.as_completed(future_to_request):
-                status_code, response_time = future.result()
-                request_count += 1
-                response_times.append(response_time)
-                if 200 <= status_code < 300:
-                    success_count += 1
-
-    avg_response_time = statistics.mean(response_times) if response_times else 0
-    max_response_time = max(response_times) if response_times else 0
-    min_response_time = min(response_times) if response_times else 0
-    success_rate = (success_count / request_count) * 100 if request_count > 0 else 0
-    
+DEFAULT_TARGET = os.getenv('BENCH_TARGET', 'http://localhost:8080')
+DEFAULT_MIX = 'submit-request=4,get-result=4,fetch-requests=1,submit-result=1'
+
+# Metrics compared against a baseline, and whether a higher value is worse
+COMPARED_METRICS = {
+    'p50_ms': True,
+    'p90_ms': True,
+    'p99_ms': True,
+    'p999_ms': True,
+    'throughput_rps': False,
+    'error_rate': True,
+    'saturation_rps': False,
+}
+
+
+def submit_request(session, target, pool, timeout):
+    response = session.post(f'{target}/submit-request', json={'query': 'Test query'}, timeout=timeout)
+    if response.status_code == 200:
+        pool.add(response.json().get('request_id'))
+    return response
+
+
+def fetch_requests(session, target, pool, timeout):
+    return session.get(f'{target}/fetch-requests', timeout=timeout)
+
+
+def submit_result(session, target, pool, timeout):
+    return session.post(f'{target}/submit-result', json={'request_id': pool.pick(), 'result': 'Test result'}, timeout=timeout)
+
+
+def get_result(session, target, pool, timeout):
+    return session.get(f'{target}/get-result/{pool.pick()}', timeout=timeout)
+
+
+ENDPOINTS = {
+    'submit-request': submit_request,
+    'fetch-requests': fetch_requests,
+    'submit-result': submit_result,
+    'get-result': get_result,
+}
+
+
+def parse_mix(value):
+    """Parse 'name=weight,name=weight' into {name: weight}."""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f'unknown endpoint {name!r} (choose from {", ".join(ENDPOINTS)})')
+        try:
+            mix[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'invalid weight for {name}: {weight!r}')
+    if not any(weight > 0 for weight in mix.values()):
+        raise argparse.ArgumentTypeError('the endpoint mix needs at least one positive weight')
+    return mix
+
+
+def run_worker(target, token, mix, deadline, warmup_until, pool, timeout):
+    # Each worker keeps its own stats so recording never takes a lock
+    session = requests.Session()
+    session.headers['Authorization'] = f'Bearer {token}'
+    stats = {name: EndpointStats() for name in mix}
+    while time.monotonic() < deadline:
+        name = pick_endpoint(mix)
+        started = time.perf_counter()
+        try:
+            status = ENDPOINTS[name](session, target, pool, timeout).status_code
+        except requests.RequestException:
+            status = 0
+        elapsed = time.perf_counter() - started
+        if time.monotonic() >= warmup_until:
+            stats[name].record(status, elapsed, name)
+    return stats
+
+
+def run_load_test(target, token, mix, duration, concurrency, warmup=0, timeout=30):
+    pool = RequestPool()
+    started = time.monotonic()
+    warmup_until = started + warmup
+    deadline = warmup_until + duration
+    results = []
+
+    def worker():
+        results.append(run_worker(target, token, mix, deadline, warmup_until, pool, timeout))
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    measured = time.monotonic() - warmup_until
+
+    endpoints = {name: EndpointStats() for name in mix}
+    for worker_stats in results:
+        for name, stats in worker_stats.items():
+            endpoints[name].merge(stats)
+    overall = EndpointStats()
+    for stats in endpoints.values():
+        overall.merge(stats)
+
     return {
-        "endpoint": endpoint,
-        "method": method,
-        "requests_completed": request_count,
-        "avg_response_time": avg_response_time,
-        "max_response_time": max_response_time,
-        "min_response_time": min_response_time,
-        "success_rate": success_rate
+        'target': target,
+        'mode': 'closed-loop',
+        'duration_s': round(measured, 3),
+        'concurrency': concurrency,
+        'mix': mix,
+        'overall': overall.summary(measured),
+        'endpoints': {name: stats.summary(measured) for name, stats in endpoints.items() if stats.requests},
     }
 
 
-def run_random_test(duration):
-    start_time = time.time()
-    results = {endpoint: {"requests": 0, "successes": 0, "response_times": []} for endpoint, _, _ in ENDPOINTS}
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONCURRENT) as executor:
-        future_to_endpoint = {}
-        with tqdm(total=duration, desc="Random Testing", unit="s", bar_format="{l_bar}{bar}| {n:.1f}/{total:.1f}s") as pbar:
-            while time.time() - start_time < duration:
-                # Submit new requests
-                while len(future_to_endpoint) < MAX_CONCURRENT:
-                    endpoint, method, data = random.choice(ENDPOINTS)
-                    future = executor.submit(make_request, endpoint, method, data)
-                    future_to_endpoint[future] = endpoint
-                
-                # Check for completed requests
-                done, _ = concurrent.futures.wait(future_to_endpoint, timeout=0.1, return_when=concurrent.futures.FIRST_COMPLETED)
-                
-                for future in done:
-                    endpoint = future_to_endpoint[future]
-                    status_code, response_time = future.result()
-                    results[endpoint]["requests"] += 1
-                    results[endpoint]["response_times"].append(response_time)
-                    if 200 <= status_code < 300:
-                        results[endpoint]["successes"] += 1
-                    del future_to_endpoint[future]
-
-                pbar.update(time.time() - start_time - pbar.n)
-
-            # Wait for any remaining requests to complete
-            for future in concurrent.futures.as_completed(future_to_endpoint):
-                endpoint = future_to_endpoint[future]
-                status_code, response_time = future.result()
-                results[endpoint]["requests"] += 1
-                results[endpoint]["response_times"].append(response_time)
-                if 200 <= status_code < 300:
-                    results[endpoint]["successes"] += 1
-
-    return results
-
-def run_load_test(duration, random_testing=False):
-    print(f"{Fore.CYAN}Starting load test for {duration} seconds with max {MAX_CONCURRENT} concurrent requests{Style.RESET_ALL}")
-    
-    if random_testing:
-        results = run_random_test(duration)
-        for endpoint, result in results.items():
-            method = next(m for e, m, _ in ENDPOINTS if e == endpoint)
-            avg_response_time = statistics.mean(result["response_times"]) if result["response_times"] else 0
-            max_response_time = max(result["response_times"]) if result["response_times"] else 0
-            min_response_time = min(result["response_times"]) if result["response_times"] else 0
-            success_rate = (result["successes"] / result["requests"]) * 100 if result["requests"] > 0 else 0
-            
-            print(f"\n{Fore.YELLOW}Results for {method} {endpoint}:{Style.RESET_ALL}")
-            print(f"{Fore.GREEN}Requests completed: {result['requests']}{Style.RESET_ALL}")
-            print(f"Average Response Time: {Fore.MAGENTA}{avg_response_time:.4f}{Style.RESET_ALL} seconds")
-            print(f"Max Response Time: {Fore.MAGENTA}{max_response_time:.4f}{Style.RESET_ALL} seconds")
-            print(f"Min Response Time: {Fore.MAGENTA}{min_response_time:.4f}{Style.RESET_ALL} seconds")
-            print(f"Success Rate: {Fore.BLUE}{success_rate:.2f}%{Style.RESET_ALL}")
+def compare(report, baseline, threshold):
+    """Return the metrics that regressed by more than ``threshold`` percent."""
+    regressions = []
+    if report['mode'] == 'ramp':
+        sections = [('overall', report, baseline)]
+    elif report['mode'] == 'find-saturation':
+        sections = [
+            (name, result, baseline.get('endpoints', {}).get(name, {}))
+            for name, result in report['endpoints'].items()
+        ]
     else:
-        for endpoint, method, data in ENDPOINTS:
-            print(f"\n{Fore.YELLOW}Testing {method} {endpoint}{Style.RESET_ALL}")
-            result = test_endpoint(endpoint, method, data, duration)
-            print_results(result, duration)
-
-
-def print_results(result, duration):
-    print(f"{Fore.GREEN}Requests completed in {duration} seconds: {result['requests_completed']}{Style.RESET_ALL}")
-    print(f"Average Response Time: {Fore.MAGENTA}{result['avg_response_time']:.4f}{Style.RESET_ALL} seconds")
-    print(f"Max Response Time: {Fore.MAGENTA}{result['max_response_time']:.4f}{Style.RESET_ALL} seconds")
-    print(f"Min Response Time: {Fore.MAGENTA}{result['min_response_time']:.4f}{Style.RESET_ALL} seconds")
-    print(f"Success Rate: {Fore.BLUE}{result['success_rate']:.2f}%{Style.RESET_ALL}")
-    
-if __name__ == "__main__":
-    while True:
-        try:
-            duration = int(input("Enter the duration of the test in seconds: "))
-            if duration <= 0:
-                raise ValueError
-            break
-        except ValueError:
-            print("Please enter a positive integer for the duration.")
+        sections = [('overall', report['overall'], baseline.get('overall', {}))]
+        sections += [
+            (name, summary, baseline.get('endpoints', {}).get(name, {}))
+            for name, summary in report['endpoints'].items()
+        ]
+    for section, current, previous in sections:
+        for metric, higher_is_worse in COMPARED_METRICS.items():
+            if current.get(metric) is None or previous.get(metric) is None:
+                continue
+            old, new = previous[metric], current[metric]
+            if metric == 'error_rate':
+                # Rates near zero make relative changes meaningless
+                regressed = new - old > threshold / 100
+            elif higher_is_worse:
+                regressed = old > 0 and new > old * (1 + threshold / 100)
+            else:
+                regressed = new < old * (1 - threshold / 100)
+            if regressed:
+                regressions.append({'section': section, 'metric': metric, 'baseline': old, 'current': new})
+    return regressions
+
+
+def print_summary(name, summary):
+    print(f"\n{Fore.YELLOW}{name}{Style.RESET_ALL}")
+    print(f"Requests: {Fore.GREEN}{summary['requests']}{Style.RESET_ALL} "
+          f"({summary['throughput_rps']} req/s), errors: {Fore.RED}{summary['error_rate']:.2%}{Style.RESET_ALL}")
+    print(f"Latency ms: p50 {Fore.MAGENTA}{summary['p50_ms']}{Style.RESET_ALL} "
+          f"p90 {Fore.MAGENTA}{summary['p90_ms']}{Style.RESET_ALL} "
+          f"p99 {Fore.MAGENTA}{summary['p99_ms']}{Style.RESET_ALL} "
+          f"p99.9 {Fore.MAGENTA}{summary['p999_ms']}{Style.RESET_ALL} "
+          f"max {summary['max_ms']}")
+
+
+def print_steps(steps):
+    for step in steps:
+        overall = step['overall']
+        reasons = step.get('saturation_reasons')
+        verdict = f"{Fore.RED}saturated: {'; '.join(reasons)}" if reasons else f"{Fore.GREEN}ok"
+        print(f"  {step['rate']:>8} req/s -> {overall['throughput_rps']:>8} req/s, "
+              f"p50 {overall['p50_ms']}ms, p99 {overall['p99_ms']}ms, "
+              f"errors {overall['error_rate']:.2%}  {verdict}{Style.RESET_ALL}")
+
+
+def print_report(report, regressions=None):
+    mode = report['mode']
+    if mode == 'closed-loop':
+        print(f"{Fore.CYAN}{report['target']}: {report['duration_s']}s with {report['concurrency']} concurrent clients{Style.RESET_ALL}")
+    elif mode == 'open-loop':
+        print(f"{Fore.CYAN}{report['target']}: {report['duration_s']}s at {report['rate']} req/s "
+              f"(send lag p99 {report['send_lag_p99_ms']}ms){Style.RESET_ALL}")
+    elif mode == 'ramp':
+        print(f"{Fore.CYAN}{report['target']}: rate ramp{Style.RESET_ALL}")
+        print_steps(report['steps'])
+        print(f"Highest sustained rate: {Fore.GREEN}{report['saturation_rps']}{Style.RESET_ALL} req/s")
+    else:
+        print(f"{Fore.CYAN}{report['target']}: saturation search (p99 SLO {report['slo_p99_ms']}ms){Style.RESET_ALL}")
+        for name, result in report['endpoints'].items():
+            print(f"\n{Fore.YELLOW}{name}{Style.RESET_ALL}")
+            print_steps(result['steps'])
+            limit = 'not reached' if not result['saturated'] else f"{result['saturation_rps']} req/s"
+            print(f"Saturation point: {Fore.GREEN}{limit}{Style.RESET_ALL}")
+
+    if mode in ('closed-loop', 'open-loop'):
+        print_summary('overall', report['overall'])
+        for name, summary in report['endpoints'].items():
+            print_summary(name, summary)
+    if regressions is not None:
+        if regressions:
+            print(f"\n{Fore.RED}Regressions against the baseline:{Style.RESET_ALL}")
+            for regression in regressions:
+                print(f"  {regression['section']} {regression['metric']}: "
+                      f"{regression['baseline']} -> {regression['current']}")
+        else:
+            print(f"\n{Fore.GREEN}No regressions against the baseline{Style.RESET_ALL}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Load test the request processing API.')
+    parser.add_argument('--target', default=DEFAULT_TARGET, help='API base URL (default: %(default)s)')
+    parser.add_argument('--token', default=os.getenv('BENCH_TOKEN'),
+                        help='Session token sent as the Bearer token (default: $BENCH_TOKEN)')
+    parser.add_argument('--duration', type=float, default=30, help='Measured seconds (default: %(default)s)')
+    parser.add_argument('--warmup', type=float, default=0, help='Unmeasured seconds before the run (default: %(default)s)')
+    parser.add_argument('--concurrency', type=int, default=50, help='Concurrent clients (default: %(default)s)')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'Weighted endpoint mix, e.g. {DEFAULT_MIX}')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds (default: %(default)s)')
+    parser.add_argument('--output', help="Write the JSON report to this file ('-' for stdout)")
+    parser.add_argument('--baseline', help='JSON report of a previous run to compare against')
+    parser.add_argument('--threshold', type=float, default=10,
+                        help='Allowed regression in percent before exiting with status 1 (default: %(default)s)')
+    parser.add_argument('--quiet', action='store_true', help='Do not print the human-readable summary')
+
+    open_loop = parser.add_argument_group('open-loop mode (requires aiohttp)')
+    open_loop.add_argument('--rate', type=float, help='Send this many requests per second for --duration, '
+                                                      'whatever the response times')
+    open_loop.add_argument('--ramp', type=parse_ramp, metavar='START:STOP:STEP',
+                           help='Step the rate from START to STOP req/s, holding each for --step-duration')
+    open_loop.add_argument('--find-saturation', action='store_true',
+                           help='Ramp each of --saturation-endpoints on its own until it saturates')
+    open_loop.add_argument('--saturation-endpoints', default='submit-request,fetch-requests',
+                           help='Endpoints for --find-saturation (default: %(default)s)')
+    open_loop.add_argument('--step-duration', type=float, default=10, help='Seconds per ramp step (default: %(default)s)')
+    open_loop.add_argument('--slo-p99-ms', type=float, default=500,
+                           help='A step whose p99 exceeds this is saturated (default: %(default)s)')
+    open_loop.add_argument('--max-error-rate', type=float, default=0.01,
+                           help='A step with a higher error rate is saturated (default: %(default)s)')
+    open_loop.add_argument('--max-in-flight', type=int, default=1000,
+                           help='Connection limit; requests beyond it wait, and the wait is measured (default: %(default)s)')
+    return parser
+
+
+def parse_ramp(value):
+    try:
+        start, stop, step = (float(part) for part in value.split(':'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected START:STOP:STEP, e.g. 50:1000:50')
+    if start <= 0 or step <= 0 or stop < start:
+        raise argparse.ArgumentTypeError('START and STEP must be positive and STOP at least START')
+    return start, stop, step
+
+
+def run_mode(args):
+    # The 'mode' of the report the arguments produce
+    if args.find_saturation:
+        return 'find-saturation'
+    if args.ramp:
+        return 'ramp'
+    if args.rate:
+        return 'open-loop'
+    return 'closed-loop'
+
+
+def run_from_args(args):
+    target = args.target.rstrip('/')
+    mode = run_mode(args)
+    if mode == 'closed-loop':
+        return run_load_test(target, args.token, args.mix, args.duration,
+                             args.concurrency, args.warmup, args.timeout)
+
+    # Imported here so the closed-loop mode keeps working without aiohttp
+    import open_loop
+
+    if mode == 'find-saturation':
+        endpoints = list(parse_mix(args.saturation_endpoints))
+        rates = open_loop.ramp_rates(*(args.ramp or (10, 2000, 10)))
+        return open_loop.find_saturation(target, args.token, endpoints, rates, args.step_duration,
+                                         args.timeout, args.max_in_flight, args.slo_p99_ms, args.max_error_rate)
+    if mode == 'ramp':
+        return open_loop.run_rate_ramp(target, args.token, args.mix, open_loop.ramp_rates(*args.ramp),
+                                       args.step_duration, args.timeout, args.max_in_flight,
+                                       args.slo_p99_ms, args.max_error_rate)
+    return open_loop.run_open_loop(target, args.token, args.mix, args.rate, args.duration,
+                                   args.timeout, args.max_in_flight)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.token:
+        print('A session token is required (--token or BENCH_TOKEN)', file=sys.stderr)
+        return 2
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        # Checked before the run: the sections and metrics of different modes
+        # do not line up, so nothing would be compared
+        mode = run_mode(args)
+        if baseline.get('mode') != mode:
+            print(f"Cannot compare a {mode} run with a {baseline.get('mode')} baseline; "
+                  f"run both with the same mode options", file=sys.stderr)
+            return 2
+
+    report = run_from_args(args)
+
+    regressions = None
+    if baseline is not None:
+        regressions = compare(report, baseline, args.threshold)
+        report['regressions'] = regressions
+        report['threshold_percent'] = args.threshold
+
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    if not args.quiet and args.output != '-':
+        print_report(report, regressions)
 
-    while True:
-        testing_mode = input("Do you want random endpoint testing? (y/n): ").lower()
-        if testing_mode in ['y', 'n']:
-            break
-        print("Please enter 'y' for yes or 'n' for no.")
+    return 1 if regressions else 0
 
-    random_testing = testing_mode == 'y'
 
-    run_load_test(duration, random_testing)
\ No newline at end of file
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""Open-loop load generation: requests are sent on a fixed schedule.
+
+A closed-loop client only sends its next request after the previous one
+returns, so a slow server receives less load and the requests that would
+have queued behind the slow ones are never measured (coordinated omission).
+Here request ``i`` of a step is scheduled at ``start + i / rate`` regardless
+of how many are still in flight, and its latency is measured from that
+scheduled time, so time spent waiting behind a stalled server is counted.
+"""
+import asyncio
+import time
+
+import aiohttp
+
+from histogram import LatencyHistogram
+from stats import EndpointStats, RequestPool, pick_endpoint
+
+
+async def submit_request(session, target, pool):
+    async with session.post(f'{target}/submit-request', json={'query': 'Test query'}) as response:
+        if response.status == 200:
+            pool.add((await response.json()).get('request_id'))
+        return response.status
+
+
+async def fetch_requests(session, target, pool):
+    async with session.get(f'{target}/fetch-requests') as response:
+        await response.read()
+        return response.status
+
+
+async def submit_result(session, target, pool):
+    async with session.post(f'{target}/submit-result',
+                            json={'request_id': pool.pick(), 'result': 'Test result'}) as response:
+        await response.read()
+        return response.status
+
+
+async def get_result(session, target, pool):
+    async with session.get(f'{target}/get-result/{pool.pick()}') as response:
+        await response.read()
+        return response.status
+
+
+ENDPOINTS = {
+    'submit-request': submit_request,
+    'fetch-requests': fetch_requests,
+    'submit-result': submit_result,
+    'get-result': get_result,
+}
+
+
+async def run_step(session, target, mix, rate, duration, pool):
+    """Send ``rate`` requests per second for ``duration`` seconds and wait for them all."""
+    loop = asyncio.get_running_loop()
+    stats = {name: EndpointStats() for name in mix}
+    # How late the generator itself sent requests; if this grows, the client
+    # machine is the bottleneck and the step's numbers are not trustworthy
+    send_lag = LatencyHistogram()
+
+    async def send(name, scheduled):
+        send_lag.record(max(0.0, loop.time() - scheduled))
+        try:
+            status = await ENDPOINTS[name](session, target, pool)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            status = 0
+        stats[name].record(status, loop.time() - scheduled, name)
+
+    tasks = []
+    start = loop.time()
+    count = int(rate * duration)
+    for position in range(count):
+        scheduled = start + position / rate
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(pick_endpoint(mix), scheduled)))
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - start
+
+    overall = EndpointStats()
+    for endpoint_stats in stats.values():
+        overall.merge(endpoint_stats)
+    return {
+        'rate': rate,
+        'duration_s': round(elapsed, 3),
+        'overall': overall.summary(elapsed),
+        'endpoints': {name: endpoint_stats.summary(elapsed) for name, endpoint_stats in stats.items()
+                      if endpoint_stats.requests},
+        'send_lag_p99_ms': round(send_lag.percentile(99) / 1000, 3),
+    }
+
+
+def saturation_reasons(step, slo_p99_ms, max_error_rate, min_throughput_ratio=0.9):
+    """Return why a step counts as saturated (an empty list if it kept up)."""
+    overall = step['overall']
+    reasons = []
+    if overall['p99_ms'] > slo_p99_ms:
+        reasons.append(f"p99 {overall['p99_ms']}ms > {slo_p99_ms}ms")
+    if overall['error_rate'] > max_error_rate:
+        reasons.append(f"error rate {overall['error_rate']:.2%} > {max_error_rate:.2%}")
+    if overall['throughput_rps'] < step['rate'] * min_throughput_ratio:
+        reasons.append(f"throughput {overall['throughput_rps']} < {min_throughput_ratio:.0%} of {step['rate']} req/s")
+    return reasons
+
+
+async def run_ramp(target, token, mix, rates, step_duration, timeout, max_in_flight,
+                   slo_p99_ms=None, max_error_rate=None, stop_at_saturation=False):
+    """Run one step per rate, optionally stopping at the first saturated step."""
+    pool = RequestPool()
+    connector = aiohttp.TCPConnector(limit=max_in_flight)
+    async with aiohttp.ClientSession(
+        connector=connector,
+        headers={'Authorization': f'Bearer {token}'},
+        timeout=aiohttp.ClientTimeout(total=timeout)
+    ) as session:
+        steps = []
+        for rate in rates:
+            step = await run_step(session, target, mix, rate, step_duration, pool)
+            if slo_p99_ms is not None:
+                step['saturation_reasons'] = saturation_reasons(step, slo_p99_ms, max_error_rate)
+            steps.append(step)
+            if stop_at_saturation and step.get('saturation_reasons'):
+                break
+    return steps
+
+
+def ramp_rates(start, stop, step):
+    rates = []
+    rate = start
+    while rate <= stop + 1e-9:
+        rates.append(round(rate, 3))
+        rate += step
+    return rates
+
+
+def run_open_loop(target, token, mix, rate, duration, timeout, max_in_flight):
+    steps = asyncio.run(run_ramp(target, token, mix, [rate], duration, timeout, max_in_flight))
+    return {'target': target, 'mode': 'open-loop', 'mix': mix, **steps[0]}
+
+
+def run_rate_ramp(target, token, mix, rates, step_duration, timeout, max_in_flight, slo_p99_ms, max_error_rate):
+    steps = asyncio.run(run_ramp(target, token, mix, rates, step_duration, timeout, max_in_flight,
+                                 slo_p99_ms, max_error_rate))
+    return {'target': target, 'mode': 'ramp', 'mix': mix, 'steps': steps,
+            'saturation_rps': saturation_rate(steps)}
+
+
+def find_saturation(target, token, endpoints, rates, step_duration, timeout, max_in_flight,
+                    slo_p99_ms, max_error_rate):
+    """Ramp each endpoint on its own until a step saturates."""
+    results = {}
+    for name in endpoints:
+        started = time.monotonic()
+        steps = asyncio.run(run_ramp(target, token, {name: 1.0}, rates, step_duration, timeout, max_in_flight,
+                                     slo_p99_ms, max_error_rate, stop_at_saturation=True))
+        results[name] = {
+            'saturation_rps': saturation_rate(steps),
+            'saturated': bool(steps[-1]['saturation_reasons']),
+            'elapsed_s': round(time.monotonic() - started, 3),
+            'steps': steps,
+        }
+    return {'target': target, 'mode': 'find-saturation', 'slo_p99_ms': slo_p99_ms,
+            'max_error_rate': max_error_rate, 'endpoints': results}
+
+
+def saturation_rate(steps):
+    # The highest rate sustained before the first saturated step
+    sustained = None
+    for step in steps:
+        if step.get('saturation_reasons'):
+            break
+        sustained = step['rate']
+    return sustained
@@ -0,0 +1,302 @@
+"""End-to-end pipeline benchmark: submit -> worker -> result.
+
+Submissions arrive at a fixed rate (open loop) while N simulated workers run
+the loop from deep-learning-simulation/script.py: long-poll
+/fetch-requests, sleep for a synthetic inference time, post the result. A
+result is visible to /get-result as soon as /submit-result (or
+/submit-results) commits, so each request's timeline is:
+
+    queue wait = fetched by a worker - submission acknowledged
+    processing = result acknowledged - fetched (inference plus submitting the result)
+    end to end = result acknowledged - submission scheduled
+
+Runs one phase per worker count, so throughput can be read against workers.
+
+    python benchmarking/pipeline.py --stack --workers 1,2,4,8 --inference-ms 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+from colorama import init, Fore, Style
+
+from histogram import LatencyHistogram
+
+# Initialize colorama
+init(autoreset=True)
+
+
+class Timeline:
+    __slots__ = ('scheduled', 'submitted', 'fetched', 'completed')
+
+    def __init__(self, scheduled):
+        self.scheduled = scheduled
+        self.submitted = None
+        self.fetched = None
+        self.completed = None
+
+
+def inference_time(mean_ms, distribution):
+    if distribution == 'exponential':
+        return random.expovariate(1000 / mean_ms) if mean_ms > 0 else 0
+    return mean_ms / 1000
+
+
+async def submitter(session, target, rate, duration, timelines, errors):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    tasks = []
+
+    async def submit(scheduled):
+        timeline = Timeline(scheduled)
+        try:
+            async with session.post(f'{target}/submit-request', json={'query': 'Benchmark query'}) as response:
+                if response.status != 200:
+                    errors['submit'] = errors.get('submit', 0) + 1
+                    return
+                request_id = (await response.json())['request_id']
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            errors['submit'] = errors.get('submit', 0) + 1
+            return
+        timeline.submitted = loop.time()
+        # A fast worker may already have fetched it before this line runs
+        existing = timelines.setdefault(request_id, timeline)
+        if existing is not timeline:
+            existing.scheduled, existing.submitted = scheduled, timeline.submitted
+
+    for position in range(int(rate * duration)):
+        scheduled = start + position / rate
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(submit(scheduled)))
+    await asyncio.gather(*tasks)
+
+
+async def worker(session, target, stop, timelines, errors, inference_ms, distribution, batch_size, fetch_wait):
+    loop = asyncio.get_running_loop()
+    params = {'wait': fetch_wait}
+    if batch_size > 1:
+        params['max'] = batch_size
+    while not stop.is_set():
+        try:
+            async with session.get(f'{target}/fetch-requests', params=params) as response:
+                if response.status == 404:
+                    continue
+                if response.status != 200:
+                    errors['fetch'] = errors.get('fetch', 0) + 1
+                    await asyncio.sleep(0.1)
+                    continue
+                data = await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            errors['fetch'] = errors.get('fetch', 0) + 1
+            await asyncio.sleep(0.1)
+            continue
+
+        fetched = loop.time()
+        lease_id = data.get('lease_id')
+        items = data['requests'] if lease_id else [data]
+        for item in items:
+            timelines.setdefault(item['request_id'], Timeline(None)).fetched = fetched
+
+        # Requests in a batch are processed one after another, as a worker would
+        await asyncio.sleep(sum(inference_time(inference_ms, distribution) for _ in items))
+        results = [{'request_id': item['request_id'], 'result': f"Processed: {item['query']}"} for item in items]
+        try:
+            if lease_id:
+                for result in results:
+                    result['lease_id'] = lease_id
+                async with session.post(f'{target}/submit-results', json={'results': results}) as response:
+                    ok = response.status == 200
+            else:
+                async with session.post(f'{target}/submit-result', json=results[0]) as response:
+                    ok = response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            ok = False
+        if not ok:
+            errors['result'] = errors.get('result', 0) + 1
+            continue
+        completed = loop.time()
+        for item in items:
+            timelines[item['request_id']].completed = completed
+
+
+async def run_phase(target, token, workers, rate, duration, drain_timeout, inference_ms, distribution,
+                    batch_size, fetch_wait):
+    timelines = {}
+    errors = {}
+    stop = asyncio.Event()
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(
+        connector=connector,
+        headers={'Authorization': f'Bearer {token}'},
+        timeout=aiohttp.ClientTimeout(total=fetch_wait + 30)
+    ) as session:
+        loop = asyncio.get_running_loop()
+        worker_tasks = [
+            asyncio.create_task(worker(session, target, stop, timelines, errors, inference_ms, distribution,
+                                       batch_size, fetch_wait))
+            for _ in range(workers)
+        ]
+        started = loop.time()
+        await submitter(session, target, rate, duration, timelines, errors)
+        window_end = loop.time()
+
+        # Let the workers finish the backlog, up to drain_timeout
+        deadline = window_end + drain_timeout
+        while loop.time() < deadline and any(
+            timeline.submitted is not None and timeline.completed is None for timeline in timelines.values()
+        ):
+            await asyncio.sleep(0.05)
+        stop.set()
+        await asyncio.gather(*worker_tasks)
+        finished = loop.time()
+
+    submitted = [timeline for timeline in timelines.values() if timeline.submitted is not None]
+    completed = [timeline for timeline in submitted if timeline.completed is not None]
+    queue_wait, processing, end_to_end = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for timeline in completed:
+        queue_wait.record(max(0.0, timeline.fetched - timeline.submitted))
+        processing.record(timeline.completed - timeline.fetched)
+        end_to_end.record(timeline.completed - timeline.scheduled)
+
+    window = window_end - started
+    completed_in_window = sum(1 for timeline in completed if timeline.completed <= window_end)
+    return {
+        'workers': workers,
+        'offered_rps': rate,
+        'window_s': round(window, 3),
+        'submitted': len(submitted),
+        'completed': len(completed),
+        'backlog_at_window_end': len(submitted) - completed_in_window,
+        'throughput_rps': round(completed_in_window / window, 2) if window else 0,
+        'drain_s': round(finished - window_end, 3),
+        'errors': errors,
+        'queue_wait': queue_wait.summary(),
+        'processing': processing.summary(),
+        'end_to_end': end_to_end.summary(),
+    }
+
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'{host}:{port} did not come up within {timeout}s')
+
+
+def start_stack_process(port, oauth_port):
+    """Run benchmarking/stack.py in a subprocess and return (process, token)."""
+    workdir = tempfile.mkdtemp(prefix='bench-pipeline-')
+    tokens_file = os.path.join(workdir, 'tokens.json')
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stack.py'),
+         '--port', str(port), '--oauth-port', str(oauth_port), '--workdir', workdir,
+         '--tokens-file', tokens_file],
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        wait_for_port('127.0.0.1', port)
+        # The stack writes its tokens just after it starts serving
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                with open(tokens_file) as tokens:
+                    return process, json.load(tokens)[0]
+            except (OSError, ValueError):
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+    except Exception:
+        process.terminate()
+        raise
+
+
+def print_phase(phase):
+    print(f"\n{Fore.YELLOW}{phase['workers']} workers{Style.RESET_ALL}: offered {phase['offered_rps']} req/s, "
+          f"completed {Fore.GREEN}{phase['throughput_rps']} req/s{Style.RESET_ALL}, "
+          f"backlog {phase['backlog_at_window_end']}, errors {phase['errors'] or 0}")
+    for name in ('queue_wait', 'processing', 'end_to_end'):
+        summary = phase[name]
+        print(f"  {name:<11} p50 {Fore.MAGENTA}{summary['p50_ms']}{Style.RESET_ALL} "
+              f"p90 {summary['p90_ms']} p99 {Fore.MAGENTA}{summary['p99_ms']}{Style.RESET_ALL} "
+              f"p99.9 {summary['p999_ms']} max {summary['max_ms']} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark submit -> worker -> result latency and throughput.')
+    parser.add_argument('--target', default=os.getenv('BENCH_TARGET', 'http://localhost:8080'))
+    parser.add_argument('--token', default=os.getenv('BENCH_TOKEN'))
+    parser.add_argument('--stack', action='store_true',
+                        help='Start the hermetic stack (benchmarking/stack.py) and benchmark it')
+    parser.add_argument('--stack-port', type=int, default=8090)
+    parser.add_argument('--workers', default='1,2,4,8', help='Comma-separated worker counts, one phase each')
+    parser.add_argument('--rate', type=float,
+                        help='Submissions per second (default: 20%% above what the workers can process)')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds of submissions per phase')
+    parser.add_argument('--drain-timeout', type=float, default=30,
+                        help='Seconds to let workers finish the backlog after each phase')
+    parser.add_argument('--inference-ms', type=float, default=200, help='Mean synthetic inference time')
+    parser.add_argument('--inference-distribution', choices=['fixed', 'exponential'], default='fixed')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='Requests leased per fetch; above 1 workers use leases and /submit-results')
+    parser.add_argument('--fetch-wait', type=float, default=5, help='Long-poll seconds per fetch')
+    parser.add_argument('--output', help="Write the JSON report to this file ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    worker_counts = [int(count) for count in args.workers.split(',')]
+    process = None
+    if args.stack:
+        process, args.token = start_stack_process(args.stack_port, args.stack_port + 1)
+        args.target = f'http://127.0.0.1:{args.stack_port}'
+    elif not args.token:
+        print('A session token is required (--token, BENCH_TOKEN or --stack)', file=sys.stderr)
+        return 2
+
+    try:
+        phases = []
+        for workers in worker_counts:
+            capacity = workers * 1000 / args.inference_ms if args.inference_ms > 0 else 100 * workers
+            rate = args.rate or round(capacity * 1.2, 2)
+            phase = asyncio.run(run_phase(
+                args.target.rstrip('/'), args.token, workers, rate, args.duration, args.drain_timeout,
+                args.inference_ms, args.inference_distribution, args.batch_size, args.fetch_wait
+            ))
+            phases.append(phase)
+            if args.output != '-':
+                print_phase(phase)
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    report = {
+        'target': args.target,
+        'inference_ms': args.inference_ms,
+        'inference_distribution': args.inference_distribution,
+        'batch_size': args.batch_size,
+        'phases': phases,
+    }
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""Hermetic benchmark stack: the API with no external services.
+
+Runs ``create_app`` against a local database (SQLite by default, or any
+SQLAlchemy URL such as a local Postgres), replaces RabbitMQ with an in-memory
+queue and points the Google/GitHub OAuth token and userinfo URLs at a local
+stub, then mints session tokens for seeded users. The in-memory queue lives
+in this process, so the stack always runs as a single (threaded) server.
+
+    python benchmarking/stack.py --port 8080 --users 5
+"""
+import argparse
+import json
+import logging
+import os
+import secrets
+import sys
+import tempfile
+import threading
+import zlib
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import jwt
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+
+class InMemoryQueueService:
+    """Stand-in for QueueService that keeps the request queue in process memory.
+
+    Implements the parts of QueueService the routes and services use, with the
+    same semantics: fetch_batch puts its requests back at the head of the queue
+    if the block raises.
+    """
+
+    def __init__(self):
+        self.messages = deque()
+        self.condition = threading.Condition()
+
+    def enqueue(self, request):
+        self.enqueue_many([request])
+
+    def enqueue_many(self, requests):
+        with self.condition:
+            self.messages.extend(json.dumps({'id': req.id, 'query': req.user_query}) for req in requests)
+            self.condition.notify(len(requests))
+
+    def publish_events(self, exchange, events):
+        # Only the 'amqp' result notification backend publishes; the stack uses 'local'
+        pass
+
+    def take(self, max_count, timeout=None):
+        with self.condition:
+            if timeout:
+                self.condition.wait_for(lambda: self.messages, timeout)
+            batch = []
+            while self.messages and len(batch) < max_count:
+                batch.append(self.messages.popleft())
+            return batch
+
+    @staticmethod
+    def to_request(message):
+        from app.models.request import Request
+        data = json.loads(message)
+        return Request(id=data['id'], query=data['query'])
+
+    def dequeue(self, timeout=None):
+        batch = self.take(1, timeout)
+        return self.to_request(batch[0]) if batch else None
+
+    @contextmanager
+    def fetch_batch(self, max_count, timeout=None):
+        batch = self.take(max_count, timeout)
+        try:
+            yield [self.to_request(message) for message in batch]
+        except Exception:
+            with self.condition:
+                self.messages.extendleft(reversed(batch))
+                self.condition.notify(len(batch))
+            raise
+
+    def pool_stats(self):
+        # Read by the queue_pool_* gauges
+        return {'idle': 0, 'in_use': 0, 'max': 0}
+
+    def depth(self):
+        with self.condition:
+            return len(self.messages)
+
+
+def install_queue_service(service):
+    """Rebind every module-level ``queue_service`` reference to ``service``."""
+    import app.routes.main as main_routes
+    import app.services.lease_service as lease_module
+    import app.services.outbox_service as outbox_module
+    import app.services.queue_service as queue_module
+
+    for module in (queue_module, main_routes, lease_module, outbox_module):
+        module.queue_service = service
+
+
+def create_oauth_stub():
+    """A stand-in for the Google and GitHub token and userinfo endpoints.
+
+    Every authorization code is accepted, and each distinct code is a distinct
+    user, so ``POST /api/auth/google {"code": "alice"}`` always signs in the
+    same user.
+    """
+    stub = Flask('oauth_stub')
+
+    def bearer_code(prefix):
+        token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not token.startswith(prefix):
+            return None
+        return token[len(prefix):]
+
+    @stub.route('/google/token', methods=['POST'])
+    def google_token():
+        return jsonify({'access_token': f"google:{request.form.get('code', '')}", 'token_type': 'Bearer'})
+
+    @stub.route('/google/userinfo', methods=['GET'])
+    def google_userinfo():
+        code = bearer_code('google:')
+        if code is None:
+            return jsonify({'error': 'invalid_token'}), 401
+        return jsonify({'sub': f'bench-{code}', 'email': f'{code}@google.bench.local', 'name': code, 'picture': None})
+
+    @stub.route('/github/token', methods=['POST'])
+    def github_token():
+        return jsonify({'access_token': f"github:{request.args.get('code', '')}", 'token_type': 'bearer'})
+
+    @stub.route('/github/user', methods=['GET'])
+    def github_user():
+        code = bearer_code('github:')
+        if code is None:
+            return jsonify({'message': 'Bad credentials'}), 401
+        return jsonify({
+            'id': zlib.crc32(code.encode()) & 0x7fffffff,
+            'login': f'bench-{code}',
+            'name': code,
+            'email': f'{code}@github.bench.local',
+            'avatar_url': None,
+        })
+
+    return stub
+
+
+def bench_config(database_url, oauth_url):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        JWT_SECRET_KEY = secrets.token_hex(32)
+        SECRET_KEY = secrets.token_hex(32)
+        GOOGLE_OAUTH_CLIENT_ID = 'bench-client'
+        GOOGLE_OAUTH_CLIENT_SECRET = 'bench-secret'
+        GOOGLE_OAUTH_REDIRECT_URI = f'{oauth_url}/callback'
+        GOOGLE_OAUTH_TOKEN_URL = f'{oauth_url}/google/token'
+        GOOGLE_OAUTH_USERINFO_URL = f'{oauth_url}/google/userinfo'
+        GITHUB_OAUTH_CLIENT_ID = 'bench-client'
+        GITHUB_OAUTH_CLIENT_SECRET = 'bench-secret'
+        GITHUB_OAUTH_REDIRECT_URI = f'{oauth_url}/callback'
+        GITHUB_OAUTH_TOKEN_URL = f'{oauth_url}/github/token'
+        GITHUB_OAUTH_USERINFO_URL = f'{oauth_url}/github/user'
+        RESULT_NOTIFY_BACKEND = 'local'
+
+    return BenchConfig
+
+
+def seed_users(count):
+    """Create (or reuse) ``count`` benchmark users; call inside an app context."""
+    from app import db
+    from app.models.user import User
+
+    users = []
+    for number in range(count):
+        google_id = f'bench-seed-{number}'
+        user = User.query.filter_by(google_id=google_id).first()
+        if user is None:
+            user = User(
+                google_id=google_id,
+                name=f'Benchmark user {number}',
+                email=f'seed-{number}@bench.local',
+                session_expiration=datetime.now(timezone.utc) + timedelta(days=1)
+            )
+            db.session.add(user)
+        users.append(user)
+    db.session.commit()
+    return users
+
+
+def mint_session_token(user, secret, lifetime=timedelta(days=1)):
+    """Return a session token for ``user`` in the format the OAuth routes issue."""
+    return jwt.encode(
+        {
+            'id': str(user.id),
+            'email': user.email,
+            'name': user.name,
+            'picture': user.picture,
+            'username': user.username,
+            'exp': int((datetime.now(timezone.utc) + lifetime).timestamp())
+        },
+        secret,
+        algorithm='HS256'
+    )
+
+
+def serve(wsgi_app, host, port):
+    # Per-request access log lines would cost more than some of the endpoints
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server(host, port, wsgi_app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name=f'serve-{port}', daemon=True)
+    thread.start()
+    return server
+
+
+def start_stack(host='127.0.0.1', port=8080, oauth_port=8081, database_url=None, workdir=None,
+                users=1, reset=False):
+    """Start the OAuth stub and the API; return (app, queue, tokens, servers)."""
+    workdir = os.path.abspath(workdir or tempfile.mkdtemp(prefix='bench-stack-'))
+    os.makedirs(workdir, exist_ok=True)
+    # Logs, profiles and filesystem sessions are written relative to the working directory
+    os.chdir(workdir)
+    database_url = database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+    from app import create_app, db
+
+    oauth_server = serve(create_oauth_stub(), host, oauth_port)
+    app = create_app(bench_config(database_url, f'http://{host}:{oauth_port}'))
+    queue = InMemoryQueueService()
+    install_queue_service(queue)
+
+    with app.app_context():
+        if reset:
+            db.drop_all()
+        db.create_all()
+        tokens = [mint_session_token(user, app.config['JWT_SECRET_KEY']) for user in seed_users(users)]
+
+    api_server = serve(app, host, port)
+    return app, queue, tokens, [api_server, oauth_server]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the API with a local database, queue and OAuth stub.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080, help='API port (default: %(default)s)')
+    parser.add_argument('--oauth-port', type=int, default=8081, help='OAuth stub port (default: %(default)s)')
+    parser.add_argument('--database', help='SQLAlchemy URL (default: SQLite in the work directory)')
+    parser.add_argument('--workdir', help='Directory for the database, logs and sessions (default: a new temp dir)')
+    parser.add_argument('--users', type=int, default=1, help='Seeded users to mint session tokens for (default: %(default)s)')
+    parser.add_argument('--reset', action='store_true', help='Drop all tables before seeding')
+    parser.add_argument('--tokens-file', help='Write the minted session tokens to this JSON file')
+    args = parser.parse_args(argv)
+    if args.users < 1:
+        parser.error('--users must be at least 1')
+    tokens_file = os.path.abspath(args.tokens_file) if args.tokens_file else None
+
+    app, queue, tokens, servers = start_stack(
+        args.host, args.port, args.oauth_port, args.database, args.workdir, args.users, args.reset
+    )
+    if tokens_file:
+        with open(tokens_file, 'w') as output:
+            json.dump(tokens, output)
+
+    print(f"API on http://{args.host}:{args.port}, OAuth stub on http://{args.host}:{args.oauth_port}, "
+          f"database {app.config['SQLALCHEMY_DATABASE_URI']}, work directory {os.getcwd()}")
+    print(f"export BENCH_TARGET=http://{args.host}:{args.port}")
+    print(f"export BENCH_TOKEN={tokens[0]}")
+    sys.stdout.flush()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
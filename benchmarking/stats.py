@@ -0,0 +1,71 @@
+import random
+import threading
+
+from histogram import LatencyHistogram
+
+
+# Non-2xx answers that are normal for an endpoint rather than errors
+EXPECTED_STATUSES = {
+    'fetch-requests': {404},  # No requests in queue
+}
+
+
+class RequestPool:
+    """Request ids submitted during the run, for the endpoints that need one."""
+
+    def __init__(self, limit=10000):
+        self.ids = []
+        self.limit = limit
+        self.lock = threading.Lock()
+
+    def add(self, request_id):
+        with self.lock:
+            if len(self.ids) >= self.limit:
+                self.ids[random.randrange(self.limit)] = request_id
+            else:
+                self.ids.append(request_id)
+
+    def pick(self):
+        with self.lock:
+            return random.choice(self.ids) if self.ids else 1
+
+
+def pick_endpoint(mix):
+    return random.choices(list(mix), list(mix.values()))[0]
+
+
+def is_success(name, status):
+    return 200 <= status < 300 or status in EXPECTED_STATUSES.get(name, ())
+
+
+class EndpointStats:
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.requests = 0
+        self.errors = 0
+        self.statuses = {}
+
+    def record(self, status, elapsed, name=None):
+        self.histogram.record(elapsed)
+        self.requests += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if not is_success(name, status):
+            self.errors += 1
+
+    def merge(self, other):
+        self.histogram.merge(other.histogram)
+        self.requests += other.requests
+        self.errors += other.errors
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        return self
+
+    def summary(self, elapsed):
+        return {
+            **self.histogram.summary(),
+            'requests': self.requests,
+            'errors': self.errors,
+            'error_rate': round(self.errors / self.requests, 4) if self.requests else 0,
+            'throughput_rps': round(self.requests / elapsed, 2) if elapsed else 0,
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items())},
+        }
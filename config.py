@@ -17,18 +17,81 @@ class Config:
     GOOGLE_OAUTH_CLIENT_ID=os.getenv('GOOGLE_OAUTH_CLIENT_ID')
     GOOGLE_OAUTH_CLIENT_SECRET=os.getenv('GOOGLE_OAUTH_CLIENT_SECRET')
     GOOGLE_OAUTH_REDIRECT_URI=os.getenv('GOOGLE_OAUTH_REDIRECT_URI')
+    GOOGLE_OAUTH_TOKEN_URL=os.getenv('GOOGLE_OAUTH_TOKEN_URL', 'https://oauth2.googleapis.com/token')
+    GOOGLE_OAUTH_USERINFO_URL=os.getenv('GOOGLE_OAUTH_USERINFO_URL', 'https://www.googleapis.com/oauth2/v3/userinfo')
     
     GITHUB_OAUTH_CLIENT_ID=os.getenv('GITHUB_OAUTH_CLIENT_ID')
     GITHUB_OAUTH_CLIENT_SECRET=os.getenv('GITHUB_OAUTH_CLIENT_SECRET')
     GITHUB_OAUTH_REDIRECT_URI=os.getenv('GITHUB_OAUTH_REDIRECT_URI')
+    GITHUB_OAUTH_TOKEN_URL=os.getenv('GITHUB_OAUTH_TOKEN_URL', 'https://github.com/login/oauth/access_token')
+    GITHUB_OAUTH_USERINFO_URL=os.getenv('GITHUB_OAUTH_USERINFO_URL', 'https://api.github.com/user')
+    
+    # Authentication Cache Configurations
+    AUTH_CACHE_SIZE=int(os.getenv('AUTH_CACHE_SIZE', 1024))
+    AUTH_CACHE_TTL=int(os.getenv('AUTH_CACHE_TTL', 60))
     
     # SESSION-Related Configurations
     SESSION_TYPE='filesystem'
     SESSION_PERMANENT=True
     PERMANENT_SESSION_LIFETIME=timedelta(minutes=5)
     
+    # Logging Configurations
+    LOG_ASYNC=os.getenv('LOG_ASYNC', 'true').lower() == 'true'
+    LOG_QUEUE_SIZE=int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    LOGS_MAX_LINES=int(os.getenv('LOGS_MAX_LINES', 10000))
+    LOG_INDEX_INTERVAL=int(os.getenv('LOG_INDEX_INTERVAL', 256 * 1024))
+    
+    # Metrics Configurations
+    METRICS_DIR=os.getenv('METRICS_DIR')  # Shared by all gunicorn workers; empty it on each deploy
+    METRICS_FLUSH_INTERVAL=int(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+    SERVER_TIMING_ENABLED=os.getenv('SERVER_TIMING_ENABLED', 'true').lower() == 'true'
+    
+    # Profiling Configurations
+    PROFILING_ENABLED=os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILE_SAMPLE_RATE=float(os.getenv('PROFILE_SAMPLE_RATE', 0))  # Fraction of requests run under cProfile
+    PROFILE_SLOW_THRESHOLD_MS=float(os.getenv('PROFILE_SLOW_THRESHOLD_MS', 0))  # Keep stack samples of slower requests; 0 disables
+    PROFILE_SAMPLER_INTERVAL_MS=float(os.getenv('PROFILE_SAMPLER_INTERVAL_MS', 5))
+    PROFILE_DIR=os.getenv('PROFILE_DIR', 'profiles')
+    PROFILE_MAX_FILES=int(os.getenv('PROFILE_MAX_FILES', 100))
+    
     # RabbitMQ Configurations
     RABBITMQ_HOST=os.getenv('RABBITMQ_HOST')
     RABBITMQ_PORT=os.getenv('RABBITMQ_PORT')
     RABBITMQ_USER=os.getenv('RABBITMQ_USER')
-    RABBITMQ_PASS=os.getenv('RABBITMQ_PASS')
\ No newline at end of file
+    RABBITMQ_PASS=os.getenv('RABBITMQ_PASS')
+    BROKER_CONNECT_TIMEOUT=float(os.getenv('BROKER_CONNECT_TIMEOUT', 2))
+    BROKER_FAILURE_THRESHOLD=int(os.getenv('BROKER_FAILURE_THRESHOLD', 3))
+    BROKER_RESET_TIMEOUT=float(os.getenv('BROKER_RESET_TIMEOUT', 10))
+    BROKER_HEARTBEAT=int(os.getenv('BROKER_HEARTBEAT', 60))
+    BROKER_POOL_SIZE=int(os.getenv('BROKER_POOL_SIZE', 10))  # Per process; long polls hold one for up to FETCH_MAX_WAIT
+    BROKER_CHECKOUT_TIMEOUT=float(os.getenv('BROKER_CHECKOUT_TIMEOUT', 5))
+    BROKER_IDLE_TIMEOUT=int(os.getenv('BROKER_IDLE_TIMEOUT', 300))
+    BROKER_MAX_LIFETIME=int(os.getenv('BROKER_MAX_LIFETIME', 3600))
+    BROKER_MAINTENANCE_INTERVAL=int(os.getenv('BROKER_MAINTENANCE_INTERVAL', 15))  # Well under BROKER_HEARTBEAT
+    
+    # ASGI Configurations
+    ASYNC_DATABASE_URL=os.getenv('ASYNC_DATABASE_URL')  # Defaults to DATABASE_URL with its async driver
+    
+    # Request Processing Configurations
+    SUBMIT_BATCH_MAX_SIZE=int(os.getenv('SUBMIT_BATCH_MAX_SIZE', 1000))
+    FETCH_MAX_WAIT=float(os.getenv('FETCH_MAX_WAIT', 30))
+    LEASE_DURATION=int(os.getenv('LEASE_DURATION', 300))
+    LEASE_MAX_BATCH_SIZE=int(os.getenv('LEASE_MAX_BATCH_SIZE', 100))
+    LEASE_SWEEP_INTERVAL=int(os.getenv('LEASE_SWEEP_INTERVAL', 30))
+    RESULT_NOTIFY_BACKEND=os.getenv('RESULT_NOTIFY_BACKEND', 'local')  # 'local' or 'amqp'
+    RESULT_STREAM_MAX_IDS=int(os.getenv('RESULT_STREAM_MAX_IDS', 100))
+    RESULT_STREAM_TIMEOUT=int(os.getenv('RESULT_STREAM_TIMEOUT', 300))
+    RESULT_STREAM_HEARTBEAT=int(os.getenv('RESULT_STREAM_HEARTBEAT', 15))
+    RESULT_CACHE_SIZE=int(os.getenv('RESULT_CACHE_SIZE', 10000))
+    RESULT_CACHE_TTL=int(os.getenv('RESULT_CACHE_TTL', 300))
+    REQUESTS_PAGE_MAX_SIZE=int(os.getenv('REQUESTS_PAGE_MAX_SIZE', 1000))
+    REQUESTS_STREAM_BATCH_SIZE=int(os.getenv('REQUESTS_STREAM_BATCH_SIZE', 500))
+    OUTBOX_BATCH_SIZE=int(os.getenv('OUTBOX_BATCH_SIZE', 500))
+    OUTBOX_POLL_INTERVAL=float(os.getenv('OUTBOX_POLL_INTERVAL', 1))
+    OUTBOX_RETRY_DELAY=float(os.getenv('OUTBOX_RETRY_DELAY', 5))
+    OUTBOX_CLAIM_TIMEOUT=int(os.getenv('OUTBOX_CLAIM_TIMEOUT', 60))  # Claims older than this are from a dead relay and taken over
+    
+    # Server Configurations (gunicorn.conf.py)
+    GUNICORN_WORKERS=int(os.getenv('GUNICORN_WORKERS', 2))
+    GUNICORN_THREADS=int(os.getenv('GUNICORN_THREADS', 8))  # Per worker; each waiting long poll or open result stream holds one
+    GUNICORN_TIMEOUT=int(os.getenv('GUNICORN_TIMEOUT', max(FETCH_MAX_WAIT, RESULT_STREAM_TIMEOUT) + 30))  # Must exceed both
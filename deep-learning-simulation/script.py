@@ -11,6 +11,8 @@ load_dotenv()
 # Configuration
 API_BASE_URL = "http://localhost:8080"  # Adjust this to your API's URL
 OAUTH_PROVIDER = "google"  # or "github"
+FETCH_WAIT = 20  # Seconds the API may block waiting for a request before returning 404
+ERROR_BACKOFF = 5  # Seconds to wait before retrying after an error
 CLIENT_ID = os.getenv(f"{OAUTH_PROVIDER.upper()}_OAUTH_CLIENT_ID")
 CLIENT_SECRET = os.getenv(f"{OAUTH_PROVIDER.upper()}_OAUTH_CLIENT_SECRET")
 REDIRECT_URI = os.getenv(f"{OAUTH_PROVIDER.upper()}_OAUTH_REDIRECT_URI")
@@ -73,7 +75,12 @@ def simulate_deep_learning_process(query):
 def fetch_request(session_token):
     """Fetch a request from the API."""
     headers["Authorization"] = f"Bearer {session_token}"
-    response = requests.get(f"{API_BASE_URL}/fetch-requests", headers=headers)
+    response = requests.get(
+        f"{API_BASE_URL}/fetch-requests",
+        params={"wait": FETCH_WAIT},
+        headers=headers,
+        timeout=FETCH_WAIT + 10
+    )
     if response.status_code == 200:
         return response.json()
     elif response.status_code == 404:
@@ -81,6 +88,7 @@ def fetch_request(session_token):
         return None
     else:
         print(f"Error fetching request: {response.status_code}")
+        time.sleep(ERROR_BACKOFF)
         return None
 
 def submit_result(session_token, request_id, result):
@@ -108,8 +116,8 @@ def main():
             result = simulate_deep_learning_process(request['query'])
             submit_result(session_token, request['request_id'], result)
         else:
-            print("No requests to process. Waiting...")
-        time.sleep(5)  # Wait for 5 seconds before next fetch
+            # The fetch already blocked server-side for up to FETCH_WAIT seconds
+            print("No requests to process. Polling again...")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,13 @@
+from config import Config
+
+# Threaded workers: a long poll waiting in /fetch-requests or an open
+# /stream-results holds one thread, and the worker's other threads keep
+# serving every other endpoint
+worker_class = 'gthread'
+workers = Config.GUNICORN_WORKERS
+threads = Config.GUNICORN_THREADS
+timeout = Config.GUNICORN_TIMEOUT
+
+for name in ('FETCH_MAX_WAIT', 'RESULT_STREAM_TIMEOUT'):
+    if timeout <= getattr(Config, name):
+        raise ValueError(f"GUNICORN_TIMEOUT ({timeout}s) must exceed {name} ({getattr(Config, name)}s)")
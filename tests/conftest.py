@@ -0,0 +1,84 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """Return a factory for apps on a fresh SQLite database in ``tmp_path``.
+
+    Logs, profiles and sessions are written relative to the working
+    directory, so the test runs inside ``tmp_path``.
+    """
+    monkeypatch.chdir(tmp_path)
+
+    def factory(**overrides):
+        from app import create_app, db
+
+        config_class = type('TestConfig', (Config,), {
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+            'JWT_SECRET_KEY': 'test',
+            'SECRET_KEY': 'test',
+            'TESTING': True,
+            **overrides,
+        })
+        app = create_app(config_class)
+        with app.app_context():
+            db.create_all()
+        return app
+
+    return factory
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def user(app):
+    from datetime import datetime, timedelta, timezone
+
+    from app import db
+    from app.models.user import User
+
+    with app.app_context():
+        user = User(name='Test user', email='test@example.com',
+                    session_expiration=datetime.now(timezone.utc) + timedelta(days=1))
+        db.session.add(user)
+        db.session.commit()
+        db.session.refresh(user)
+        db.session.expunge(user)
+    return user
+
+
+@pytest.fixture
+def add_requests(app, user):
+    """Return a function that adds ``count`` requests for ``user`` and returns their IDs."""
+    from app import db
+    from app.models.request import Request
+
+    def add(count, **values):
+        with app.app_context():
+            requests = [Request(user_query=f'query {number}', user_id=user.id, **values) for number in range(count)]
+            db.session.add_all(requests)
+            db.session.commit()
+            return [req.id for req in requests]
+
+    return add
+
+
+@pytest.fixture
+def auth_headers(app, user):
+    import time
+
+    import jwt
+
+    token = jwt.encode({'id': str(user.id), 'exp': int(time.time()) + 3600}, app.config['JWT_SECRET_KEY'],
+                       algorithm='HS256')
+    return {'Authorization': f'Bearer {token}'}
@@ -0,0 +1,45 @@
+import time
+import uuid
+
+import jwt
+import pytest
+
+
+def token_header(app, **claims):
+    return {'Authorization': 'Bearer ' + jwt.encode(claims, app.config['JWT_SECRET_KEY'], algorithm='HS256')}
+
+
+@pytest.mark.parametrize('headers, reason, msg', [
+    ({}, 'missing_header', 'Missing Authorization header'),
+    ({'Authorization': 'Basic abc'}, 'invalid_header', 'Invalid Authorization header'),
+    ({'Authorization': 'Bearer'}, 'invalid_header', 'Token not found'),
+    ({'Authorization': 'Bearer a b'}, 'invalid_header', 'Invalid Authorization header'),
+    ({'Authorization': 'Bearer not-a-jwt'}, 'invalid_token', 'Invalid session'),
+])
+def test_malformed_credentials_are_rejected(app, headers, reason, msg):
+    from app.utils.metrics import auth_failures
+
+    before = auth_failures.collect().get((reason,), 0)
+    response = app.test_client().get('/get-result/1', headers=headers)
+    assert response.status_code == 401
+    assert response.json == {'msg': msg}
+    assert auth_failures.collect()[(reason,)] == before + 1
+
+
+def test_expired_and_unknown_tokens_are_rejected(app, user):
+    client = app.test_client()
+
+    response = client.get('/get-result/1', headers=token_header(app, id=str(user.id), exp=int(time.time()) - 1))
+    assert (response.status_code, response.json) == (401, {'msg': 'Session expired'})
+
+    response = client.get('/get-result/1', headers=token_header(app, id=str(uuid.uuid4()), exp=int(time.time()) + 60))
+    assert (response.status_code, response.json) == (401, {'msg': 'Invalid session'})
+
+
+def test_valid_token_is_cached(app, auth_headers, add_requests):
+    from app.utils.auth import principal_cache
+
+    request_id, = add_requests(1)
+    client = app.test_client()
+    assert client.get(f'/get-result/{request_id}', headers=auth_headers).status_code == 200
+    assert principal_cache.get(auth_headers['Authorization'].split()[1]) is not None
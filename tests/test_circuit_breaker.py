@@ -0,0 +1,59 @@
+import pytest
+
+from app.utils import circuit_breaker
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpen
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker, 'time', clock)
+    return clock
+
+
+def test_breaker_opens_half_opens_and_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 4
+    with pytest.raises(CircuitOpen) as rejected:
+        breaker.before_call()
+    assert rejected.value.retry_after == 6
+
+    # After reset_timeout a single trial call is let through
+    clock.now += 6
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+    breaker.before_call()
+
+
+def test_failed_trial_reopens_the_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    breaker.before_call()
+
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_after() == 10
@@ -0,0 +1,17 @@
+def test_result_is_validated_by_etag_only(app, auth_headers, add_requests):
+    [request_id] = add_requests(1)
+    client = app.test_client()
+
+    response = client.get(f'/get-result/{request_id}', headers=auth_headers)
+    assert response.status_code == 200
+    assert 'Last-Modified' not in response.headers
+    etag = response.headers['ETag']
+
+    response = client.get(f'/get-result/{request_id}', headers={**auth_headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+
+    # A date can't tell a result completed in the same second apart from the
+    # pending one, so it must not produce a 304
+    response = client.get(f'/get-result/{request_id}',
+                          headers={**auth_headers, 'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+    assert response.status_code == 200
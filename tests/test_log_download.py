@@ -0,0 +1,32 @@
+import zstandard
+
+from app.utils import log_archive
+
+
+def test_range_request_compresses_the_selection_once(app, auth_headers, tmp_path, monkeypatch):
+    # Log downloads read from <root_path>/../logs
+    (tmp_path / 'app').mkdir()
+    (tmp_path / 'logs').mkdir(exist_ok=True)
+    app.root_path = str(tmp_path / 'app')
+    (tmp_path / 'logs' / 'info.log.2024-01-01').write_bytes(b''.join(b'line %d\n' % n for n in range(10000)))
+    passes = []
+    compress_stream = log_archive.compress_stream
+
+    def counted_compress_stream(chunks, compress):
+        passes.append(compress)
+        return compress_stream(chunks, compress)
+
+    monkeypatch.setattr(log_archive, 'compress_stream', counted_compress_stream)
+    client = app.test_client()
+    url = '/logs/download?type=info&files=2024-01-01&compress=zstd'
+
+    full = client.get(url, headers=auth_headers)
+    assert full.status_code == 200
+    assert zstandard.ZstdDecompressor().decompressobj().decompress(full.data).startswith(b'line 0\n')
+
+    passes.clear()
+    resumed = client.get(url, headers={**auth_headers, 'Range': 'bytes=100-'})
+    assert resumed.status_code == 206
+    assert resumed.data == full.data[100:]
+    assert resumed.headers['Content-Range'] == f'bytes 100-{len(full.data) - 1}/{len(full.data)}'
+    assert passes == ['zstd']
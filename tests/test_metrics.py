@@ -0,0 +1,34 @@
+import threading
+
+from app.utils.metrics import Counter, Histogram
+
+
+def run_in_threads(target, count):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_shards_of_exited_threads_are_folded():
+    counter = Counter('test_total', 'Test counter', ('kind',))
+    histogram = Histogram('test_seconds', 'Test histogram', buckets=(1.0,))
+
+    def record():
+        counter.inc('a')
+        histogram.observe(0.5)
+
+    run_in_threads(record, 5)
+    counter.inc('b', amount=2)
+
+    assert counter.collect() == {('a',): 5, ('b',): 2}
+    assert histogram.collect() == {(): [5, 0, 2.5, 5]}
+    # Only the main thread's shard is still held
+    assert len(counter.shards) == 1
+    assert histogram.shards == []
+
+    run_in_threads(record, 5)
+
+    assert counter.collect() == {('a',): 10, ('b',): 2}
+    assert histogram.collect() == {(): [10, 0, 5.0, 10]}
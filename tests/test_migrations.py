@@ -0,0 +1,26 @@
+import logging.config
+import os
+
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from flask_migrate import downgrade, upgrade
+
+from app import db
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+def test_migrations_match_models(make_app, monkeypatch):
+    # env.py's fileConfig() would disable the app's loggers for later tests
+    monkeypatch.setattr(logging.config, 'fileConfig', lambda *args, **kwargs: None)
+    app = make_app()
+    with app.app_context():
+        db.drop_all()
+        upgrade(directory=MIGRATIONS)
+        with db.engine.connect() as connection:
+            # SQLite reflects UUID columns as NUMERIC, so types are not compared
+            context = MigrationContext.configure(connection, opts={'compare_type': False})
+            assert compare_metadata(context, db.metadata) == []
+
+        downgrade(directory=MIGRATIONS, revision='base')
+        assert db.inspect(db.engine).get_table_names() == ['alembic_version']
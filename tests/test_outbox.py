@@ -0,0 +1,51 @@
+import pytest
+
+from app import db
+from app.models.outbox import OutboxMessage
+from app.models.request import Request
+from app.services import outbox_service
+from app.services.outbox_service import claim_batch_statement, outbox_relay
+from app.services.queue_service import BrokerUnavailable
+
+
+@pytest.fixture
+def outbox(app, user):
+    with app.app_context():
+        requests = [Request(user_query=f'query {number}', user_id=user.id) for number in range(3)]
+        db.session.add_all(requests + [OutboxMessage(request=req) for req in requests])
+        db.session.commit()
+        yield [req.id for req in requests]
+
+
+def claims():
+    return sorted(db.session.execute(db.select(OutboxMessage.claimed_by)).scalars().all(), key=str)
+
+
+def test_relays_claim_disjoint_batches(outbox):
+    assert db.session.execute(claim_batch_statement('first', 2, 60)).rowcount == 2
+    assert db.session.execute(claim_batch_statement('second', 2, 60)).rowcount == 1
+    assert db.session.execute(claim_batch_statement('third', 2, 60)).rowcount == 0
+    assert claims() == ['first', 'first', 'second']
+
+    # Claims older than the timeout are taken over
+    assert db.session.execute(claim_batch_statement('fourth', 5, -1)).rowcount == 3
+
+
+def test_relay_publishes_and_deletes_its_batch(outbox, monkeypatch):
+    published = []
+    monkeypatch.setattr(outbox_service.queue_service, 'enqueue_many', published.extend)
+
+    assert outbox_relay.relay_batch() == 3
+    assert [req.id for req in published] == outbox
+    assert claims() == []
+
+
+def test_relay_releases_its_batch_when_publishing_fails(outbox, monkeypatch):
+    def enqueue_many(requests):
+        raise BrokerUnavailable('down', 1)
+
+    monkeypatch.setattr(outbox_service.queue_service, 'enqueue_many', enqueue_many)
+
+    with pytest.raises(BrokerUnavailable):
+        outbox_relay.relay_batch()
+    assert claims() == [None, None, None]
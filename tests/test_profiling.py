@@ -0,0 +1,36 @@
+import os
+import threading
+import time
+
+from app.utils.profiling import cprofile_lock
+
+
+def test_concurrent_profiled_requests(make_app):
+    app = make_app(PROFILING_ENABLED=True, PROFILE_SAMPLE_RATE=1.0, PROFILE_SLOW_THRESHOLD_MS=1,
+                   PROFILE_SAMPLER_INTERVAL_MS=1)
+    both_in_flight = threading.Barrier(2, timeout=5)
+
+    @app.route('/overlap')
+    def overlap():
+        # Holds each request open until the other one is running too
+        both_in_flight.wait()
+        # Long enough for the sampler to take a few samples
+        time.sleep(0.05)
+        return 'ok'
+
+    statuses = []
+
+    def get():
+        statuses.append(app.test_client().get('/overlap').status_code)
+
+    threads = [threading.Thread(target=get) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses == [200, 200]
+    assert not cprofile_lock.locked()
+    # One request ran under cProfile, the other fell back to the stack sampler
+    extensions = sorted(name.rsplit('.', 1)[1] for name in os.listdir(app.config['PROFILE_DIR']))
+    assert extensions == ['folded', 'prof']
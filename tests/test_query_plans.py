@@ -0,0 +1,64 @@
+"""Checks that the hot Request queries use their indexes, via SQLite's EXPLAIN QUERY PLAN.
+
+The statements are captured as the app issues them, so the checks follow the
+queries if they change.
+"""
+import base64
+import contextlib
+import json
+import threading
+
+from sqlalchemy import event
+
+from app import db
+from app.services.lease_service import lease_service
+
+
+@contextlib.contextmanager
+def captured_statements():
+    statements = []
+    # The outbox relay thread queries the same engine in the background
+    thread_id = threading.get_ident()
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread_id and ('FROM request' in statement or statement.startswith('UPDATE request')):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+
+def query_plans(statements):
+    with db.engine.connect() as connection:
+        return [
+            ' '.join(row.detail for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters))
+            for statement, parameters in statements
+        ]
+
+
+def test_requests_pages_use_user_index(app, auth_headers):
+    cursor = base64.urlsafe_b64encode(json.dumps(['2024-01-01T00:00:00', 0]).encode()).decode()
+    client = app.test_client()
+    with app.app_context():
+        with captured_statements() as statements:
+            assert client.get('/requests?limit=10', headers=auth_headers).status_code == 200
+            assert client.get(f'/requests?limit=10&cursor={cursor}', headers=auth_headers).status_code == 200
+        plans = query_plans(statements)
+
+    assert len(plans) == 2
+    for plan in plans:
+        # The index serves both the filter and the keyset order, so no sort
+        assert 'USING INDEX ix_request_user_id_created_at' in plan, plan
+        assert 'TEMP B-TREE' not in plan, plan
+
+
+def test_expired_lease_sweep_uses_status_index(app):
+    with app.app_context():
+        with captured_statements() as statements:
+            lease_service.sweep_expired()
+        [plan] = query_plans(statements)
+
+    assert 'USING INDEX ix_request_status_created_at' in plan, plan
@@ -0,0 +1,69 @@
+import os
+import time
+
+import pytest
+
+from app.services.queue_service import BrokerUnavailable, PoolExhausted, PooledConnection, QueueService
+from config import Config
+
+
+class FakeChannel:
+    is_open = True
+
+    def __getattr__(self, name):
+        # confirm_delivery, basic_qos, queue_declare, ...
+        return lambda *args, **kwargs: None
+
+
+class FakeConnection:
+    def __init__(self):
+        self.is_open = True
+        self.events_processed = 0
+
+    def channel(self):
+        return FakeChannel()
+
+    def process_data_events(self, time_limit=None):
+        self.events_processed += 1
+
+    def close(self):
+        self.is_open = False
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(Config, 'BROKER_CHECKOUT_TIMEOUT', 0.05)
+    service = QueueService(max_connections=1)
+    # No maintenance thread: the tests call maintain() themselves
+    service.pid = os.getpid()
+    monkeypatch.setattr(service, 'create_connection', FakeConnection)
+    return service
+
+
+def test_exhausted_pool_raises_broker_unavailable(pool):
+    with pool.get_connection():
+        started = time.monotonic()
+        with pytest.raises(BrokerUnavailable) as exhausted:
+            with pool.get_connection():
+                pass
+    assert isinstance(exhausted.value, PoolExhausted)
+    assert time.monotonic() - started >= Config.BROKER_CHECKOUT_TIMEOUT
+    # The slot was given back, and the breaker did not count it as a failure
+    assert pool.pool_stats() == {'idle': 1, 'in_use': 0, 'max': 1}
+    assert pool.breaker.failures == 0
+
+
+def test_maintain_evicts_idle_and_expired_connections(pool):
+    pool.max_connections = 3
+    now = time.monotonic()
+    idle, expired, fresh = (PooledConnection(FakeConnection()) for _ in range(3))
+    idle.last_used = now - Config.BROKER_IDLE_TIMEOUT - 1
+    expired.created_at = now - Config.BROKER_MAX_LIFETIME - 1
+    pool.connections = [idle, expired, fresh]
+
+    pool.maintain()
+
+    assert pool.connections == [fresh]
+    assert pool.in_use == 0
+    assert not idle.connection.is_open and not expired.connection.is_open
+    assert fresh.connection.is_open and fresh.connection.events_processed == 1
@@ -0,0 +1,31 @@
+import logging
+
+
+def phases(response):
+    return {item.split(';')[0]: item for item in response.headers['Server-Timing'].split(', ')}
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_phases_do_not_overlap_and_timing_is_on_the_request_log_line(app, auth_headers, add_requests):
+    [request_id] = add_requests(1)
+    handler = ListHandler()
+    app.logger.addHandler(handler)
+
+    response = app.test_client().get(f'/get-result/{request_id}', headers=auth_headers)
+
+    timing = phases(response)
+    # Cache miss: one user query under auth_lookup, and only the handler's
+    # own query under db
+    assert 'desc' not in timing['auth_lookup']
+    assert 'desc' not in timing['db']
+    records = handler.records
+    assert [record.getMessage() for record in records] == [f'Result retrieved for request ID: {request_id}']
+    assert set(records[0].timing) >= {'auth_decode', 'auth_lookup', 'db', 'total'}
@@ -0,0 +1,42 @@
+import json
+
+
+def sse_events(body):
+    events = []
+    for block in body.split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if lines:
+            events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_stream_ends_once_every_request_is_done(app, auth_headers, add_requests):
+    from app import db
+    from app.models.request import Request
+
+    completed_id, pending_id = add_requests(2)
+    with app.app_context():
+        req = db.session.get(Request, completed_id)
+        req.status, req.result = 'completed', 'done'
+        db.session.commit()
+
+    app.config['RESULT_STREAM_HEARTBEAT'] = 0.05
+    app.config['RESULT_STREAM_TIMEOUT'] = 0.2
+    response = app.test_client().get(f'/stream-results?ids={completed_id},{pending_id},{pending_id},999999',
+                                     headers=auth_headers)
+    assert sse_events(response.get_data(as_text=True)) == [
+        ('result', {'request_id': completed_id, 'status': 'completed', 'result': 'done'}),
+        ('result', {'request_id': pending_id, 'status': 'pending', 'result': None}),
+        ('result', {'request_id': 999999, 'status': 'not_found'}),
+        ('end', {'pending': [pending_id]}),
+    ]
+
+
+def test_invalid_ids_are_rejected(app, auth_headers):
+    client = app.test_client()
+    for ids, message in [('1,x', 'ids must be comma-separated integers'),
+                         ('', 'At least one request ID is required'),
+                         (','.join(map(str, range(app.config['RESULT_STREAM_MAX_IDS'] + 1))),
+                          f"At most {app.config['RESULT_STREAM_MAX_IDS']} request IDs may be streamed")]:
+        response = client.get(f'/stream-results?ids={ids}', headers=auth_headers)
+        assert (response.status_code, response.json) == (400, {'message': message})
@@ -0,0 +1,60 @@
+from sqlalchemy import update
+
+from app import db
+from app.models.request import Request
+from app.routes import main
+from app.services.lease_service import complete_requests_statement
+
+
+def test_boolean_request_id_is_rejected(app, auth_headers, add_requests):
+    add_requests(1)
+
+    response = app.test_client().post('/submit-results', headers=auth_headers,
+                                      json={'results': [{'request_id': True, 'result': 'done'}]})
+
+    assert response.status_code == 400
+    with app.app_context():
+        assert db.session.get(Request, 1).status == 'pending'
+
+
+def test_lease_lost_after_check_is_not_overwritten(app, auth_headers, add_requests, monkeypatch):
+    kept, lost = add_requests(2, status='processing', lease_id='old-lease')
+
+    def release_lease_first(results):
+        # A sweep and a new lease land between the lease check and the UPDATE
+        db.session.execute(update(Request).where(Request.id == lost).values(lease_id='new-lease'))
+        return complete_requests_statement(results)
+
+    monkeypatch.setattr(main, 'complete_requests_statement', release_lease_first)
+    response = app.test_client().post('/submit-results', headers=auth_headers, json={'results': [
+        {'request_id': kept, 'lease_id': 'old-lease', 'result': 'kept'},
+        {'request_id': lost, 'lease_id': 'old-lease', 'result': 'stale'},
+    ]})
+
+    assert response.status_code == 200
+    assert response.json['results'] == [
+        {'request_id': kept, 'status': 'completed'},
+        {'request_id': lost, 'status': 'lease_expired'},
+    ]
+    with app.app_context():
+        assert (db.session.get(Request, kept).status, db.session.get(Request, kept).result) == ('completed', 'kept')
+        assert (db.session.get(Request, lost).status, db.session.get(Request, lost).lease_id) == ('processing', 'new-lease')
+
+
+def test_single_result_with_lost_lease_is_rejected(app, auth_headers, add_requests, monkeypatch):
+    [request_id] = add_requests(1, status='processing', lease_id='old-lease')
+
+    def release_lease_first(results):
+        db.session.execute(update(Request).where(Request.id == request_id).values(lease_id='new-lease'))
+        return complete_requests_statement(results)
+
+    monkeypatch.setattr(main, 'complete_requests_statement', release_lease_first)
+    client = app.test_client()
+    response = client.post('/submit-result', headers=auth_headers,
+                           json={'request_id': request_id, 'lease_id': 'old-lease', 'result': 'stale'})
+
+    assert response.status_code == 409
+    with app.app_context():
+        assert db.session.get(Request, request_id).lease_id == 'new-lease'
+    assert client.post('/submit-result', headers=auth_headers,
+                       json={'request_id': request_id + 1, 'result': 'done'}).status_code == 404